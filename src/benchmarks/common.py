@@ -0,0 +1,44 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree. An additional grant
+# of patent rights can be found in the PATENTS file in the same directory.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from run import create_tasks_from_config
+
+
+class AllTasksScheduler:
+    '''
+    Goes through all the tasks of a configuration in turn: the benchmarks
+    care about what the tasks do, not about the curriculum.
+    '''
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.i = 0
+
+    def get_next_task(self, train_mode=True):
+        ret = self.tasks[self.i]
+        self.i = (self.i + 1) % len(self.tasks)
+        return ret
+
+    def step(self, reward, train_mode=True):
+        pass
+
+
+def create_scheduler(tasks_config_file):
+    '''Returns a scheduler over all the tasks in the configuration file'''
+    return AllTasksScheduler(create_tasks_from_config(tasks_config_file).tasks)
+
+
+def run_learner(env, learner, steps):
+    '''Makes the learner interact with the environment for some steps'''
+    token = None
+    for _ in range(steps):
+        token, reward = env.next(token)
+        learner.try_reward(reward)
+        token = learner.next(token)
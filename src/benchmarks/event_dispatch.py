@@ -0,0 +1,98 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree. An additional grant
+# of patent rights can be found in the PATENTS file in the same directory.
+
+'''
+Measures how many MessageReceived events per second the EventManager
+dispatches, with the compiled dispatch chains and with the original generic
+loop, for a few numbers of registered `on_message` triggers.
+
+Usage (from the src directory)::
+
+    python -m benchmarks.event_dispatch [-n EVENTS] [-t TRIGGERS ...]
+'''
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from optparse import OptionParser
+import logging
+import timeit
+from core.events import EventManager
+from core.task import MessageReceived, on_message, handler_to_trigger
+
+
+class LegacyEventManager(EventManager):
+    '''EventManager.raise_event before the dispatch chains'''
+    def raise_event(self, event):
+        handled = False
+        if event.__class__ in self.triggers:
+            for observer, trigger in self.triggers[event.__class__]:
+                condition_outcome = trigger.condition(event)
+                if condition_outcome:
+                    try:
+                        event.condition_outcome = condition_outcome
+                    except AttributeError:
+                        self.logger.debug("Couldn't save condition outcome "
+                                          "for event {0}".format(event))
+                    self.logger.debug('{0} handled by {1}'.format(
+                        event, trigger.event_handler))
+                    trigger.event_handler(observer, event)
+                    handled = True
+        return handled
+
+
+class Observer(object):
+    pass
+
+
+def register_triggers(event_manager, n_triggers):
+    '''Registers n_triggers on_message handlers (as a task would)'''
+    observer = Observer()
+    for i in range(n_triggers):
+        def handler(self, event):
+            pass
+        # the first trigger matches the messages, the others do not
+        pattern = 'say hello$' if i == 0 else 'answer {0}$'.format(i)
+        event_manager.register(
+            observer, handler_to_trigger(on_message(pattern)(handler)))
+
+
+def bench(event_manager, messages, repeat):
+    raise_event = event_manager.raise_event
+    return min(timeit.repeat(
+        lambda: [raise_event(MessageReceived(m)) for m in messages],
+        number=1, repeat=repeat))
+
+
+def main():
+    op = OptionParser("Usage: %prog [options]")
+    op.add_option('-n', '--events', default=20000, type=int,
+                  help='number of events raised per timing')
+    op.add_option('-t', '--triggers', action='append', type=int,
+                  help='number of registered triggers (can be repeated)')
+    op.add_option('-r', '--repeat', default=5, type=int,
+                  help='number of timing repetitions (the best one is kept)')
+    opt, args = op.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    # the received messages grow as they do within a task
+    messages = ['you say hello'[:i % 14] for i in range(opt.events)]
+    print('{0:>9}{1:>16}{2:>16}{3:>9}'.format(
+        'triggers', 'legacy (ev/s)', 'chains (ev/s)', 'speedup'))
+    for n_triggers in opt.triggers or [1, 20]:
+        rates = []
+        for manager_class in (LegacyEventManager, EventManager):
+            event_manager = manager_class()
+            register_triggers(event_manager, n_triggers)
+            rates.append(len(messages) /
+                         bench(event_manager, messages, opt.repeat))
+        print('{0:>9}{1:>16.0f}{2:>16.0f}{3:>8.1f}x'.format(
+            n_triggers, rates[0], rates[1], rates[1] / rates[0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree. An additional grant
+# of patent rights can be found in the PATENTS file in the same directory.
+
+'''
+Compares the table-driven codec of the StandardSerializer against the
+original per-byte conversion with bin()/int(). The messages are the ones that
+the environment actually sends when running the given task configurations.
+
+Usage (from the src directory)::
+
+    python -m benchmarks.serializer_codec [-n STEPS] [config ...]
+'''
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from optparse import OptionParser
+import codecs
+import logging
+import random
+import timeit
+from core.environment import Environment
+from core.serializer import StandardSerializer
+from learners.sample_learners import SampleSilentLearner
+from benchmarks.common import create_scheduler, run_learner
+
+DEFAULT_CONFIGS = ['tasks_config.sample.json', 'tasks_config.micro.json',
+                   'tasks_config.small_comp.json']
+
+
+def legacy_to_binary(message):
+    '''StandardSerializer.to_binary before the codec tables'''
+    message = codecs.encode(message, 'utf-8')
+    data = []
+    for c in message:
+        try:
+            c = ord(c)
+        except TypeError:
+            pass
+        data.append(bin(c)[2:].zfill(8))
+    return ''.join(data)
+
+
+def legacy_to_text(data):
+    '''StandardSerializer.to_text before the codec tables'''
+    for skip in range(int(len(data) / 8)):
+        try:
+            message = bytearray()
+            sub_data = data[skip * 8:]
+            for i in range(int(len(sub_data) / 8)):
+                message.append(int(sub_data[i * 8:(i + 1) * 8], 2))
+            return codecs.decode(message, 'utf-8')
+        except UnicodeDecodeError:
+            pass
+    return None
+
+
+class RecordingSerializer(StandardSerializer):
+    '''Remembers every message it is asked to encode'''
+    def __init__(self):
+        StandardSerializer.__init__(self)
+        self.messages = []
+
+    def to_binary(self, message):
+        self.messages.append(message)
+        return StandardSerializer.to_binary(self, message)
+
+
+def collect_messages(tasks_config_file, steps):
+    '''Runs a silent learner on the tasks and returns the teacher messages'''
+    serializer = RecordingSerializer()
+    env = Environment(serializer, create_scheduler(tasks_config_file))
+    run_learner(env, SampleSilentLearner(), steps)
+    return serializer.messages
+
+
+def bench(function, inputs, repeat):
+    return min(timeit.repeat(lambda: [function(x) for x in inputs],
+                             number=1, repeat=repeat))
+
+
+def main():
+    op = OptionParser("Usage: %prog [options] [tasks_config.json ...]")
+    op.add_option('-n', '--steps', default=20000, type=int,
+                  help='number of environment steps used to collect messages')
+    op.add_option('-r', '--repeat', default=5, type=int,
+                  help='number of timing repetitions (the best one is kept)')
+    opt, args = op.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    random.seed(0)
+    serializer = StandardSerializer()
+    print('{0:<30}{1:>9}{2:>10}{3:>12}{4:>11}{5:>9}'.format(
+        'config', 'messages', 'codec', 'legacy (s)', 'table (s)', 'speedup'))
+    for tasks_config_file in args or DEFAULT_CONFIGS:
+        messages = collect_messages(tasks_config_file, opt.steps)
+        encoded = [serializer.to_binary(m) for m in messages]
+        # the tables must produce exactly the same encoding
+        assert encoded == [legacy_to_binary(m) for m in messages]
+        assert [serializer.to_text(e) for e in encoded] == \
+            [legacy_to_text(e) for e in encoded]
+        for codec, legacy_f, table_f, inputs in [
+                ('encode', legacy_to_binary, serializer.to_binary, messages),
+                ('decode', legacy_to_text, serializer.to_text, encoded)]:
+            legacy = bench(legacy_f, inputs, opt.repeat)
+            table = bench(table_f, inputs, opt.repeat)
+            print('{0:<30}{1:>9}{2:>10}{3:>12.4f}{4:>11.4f}{5:>8.1f}x'.format(
+                tasks_config_file, len(messages), codec, legacy, table,
+                legacy / table))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree. An additional grant
+# of patent rights can be found in the PATENTS file in the same directory.
+
+'''
+Runs the navigation tasks with a learner that keeps on giving navigation
+commands, and compares the StateChanged events (and the `state_updated`
+notifications, which make the console view repaint the world) raised when
+every change to the states is reported right away against the ones raised
+with the state transactions.
+
+Usage (from the src directory)::
+
+    python -m benchmarks.state_transactions [-n STEPS]
+'''
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from optparse import OptionParser
+import logging
+import random
+import timeit
+from core.environment import Environment
+from core.serializer import StandardSerializer
+from learners.base import BaseLearner
+from worlds.grid_world import GridWorld
+import tasks.competition.navigation as navigation
+from benchmarks.common import AllTasksScheduler, run_learner
+
+TASKS = [navigation.TurningTask, navigation.MovingTask,
+         navigation.MovingRelativeTask, navigation.MovingAbsoluteTask,
+         navigation.PickUpTask, navigation.PickUpAroundTask,
+         navigation.PickUpInFrontTask, navigation.GivingTask,
+         navigation.PickUpAroundAndGiveTask,
+         navigation.CountingInventoryGivingTask]
+
+COMMANDS = ['I turn left.', 'I move forward.', 'I pick up the apple.',
+            'I turn right.', 'I move forward.', 'I give you an apple.',
+            'I look.']
+
+
+class CountingEnvironment(Environment):
+    '''Environment that counts the StateChanged events it raises'''
+    def __init__(self, *args, **kwargs):
+        Environment.__init__(self, *args, **kwargs)
+        self.state_changes = 0
+
+    def raise_state_changed(self):
+        raised = Environment.raise_state_changed(self)
+        self.state_changes += raised
+        return raised
+
+
+class LegacyEnvironment(CountingEnvironment):
+    '''Reports every change to the states right away (no transactions)'''
+    def state_changed(self, script):
+        return self._notify_state_changed([script])
+
+
+class CommandingLearner(BaseLearner):
+    '''Says the navigation commands in turn, regardless of the teacher'''
+    def __init__(self, serializer):
+        self._bits = ''.join(serializer.to_binary(c + ' ') for c in COMMANDS)
+        self._i = 0
+
+    def next(self, input):
+        bit = self._bits[self._i]
+        self._i = (self._i + 1) % len(self._bits)
+        return bit
+
+
+def run(environment_class, steps):
+    '''Runs the tasks for some steps and returns the environment and the
+    number of state_updated notifications'''
+    random.seed(0)
+    serializer = StandardSerializer()
+    world = GridWorld()
+    env = environment_class(serializer, AllTasksScheduler(
+        [task(world=world) for task in TASKS]), max_history=1000)
+    notifications = []
+    world.state_updated.register(notifications.append)
+    run_learner(env, CommandingLearner(serializer), steps)
+    return env, len(notifications)
+
+
+def main():
+    op = OptionParser("Usage: %prog [options]")
+    op.add_option('-n', '--steps', default=100000, type=int,
+                  help='number of environment steps per run')
+    op.add_option('-r', '--repeat', default=3, type=int,
+                  help='number of timing repetitions (the best one is kept)')
+    opt, args = op.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    print('{0:<14}{1:>14}{2:>14}{3:>14}'.format(
+        'environment', 'StateChanged', 'repaints', 'steps/s'))
+    for name, environment_class in [('immediate', LegacyEnvironment),
+                                    ('transactions', CountingEnvironment)]:
+        env, notifications = run(environment_class, opt.steps)
+        elapsed = min(timeit.repeat(
+            lambda: run(environment_class, opt.steps), number=1,
+            repeat=opt.repeat))
+        print('{0:<14}{1:>14}{2:>14}{3:>14.0f}'.format(
+            name, env.state_changes, notifications, opt.steps / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree. An additional grant
+# of patent rights can be found in the PATENTS file in the same directory.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+# string rendering of every possible byte value, most significant bit first
+BYTE_TO_BITS = tuple(format(i, '08b') for i in range(256))
+
+
+def is_bit(symbol):
+    '''Tells if a symbol represents a bit (either as a string or an int)'''
+    return symbol == '0' or symbol == '1' or symbol == 0 or symbol == 1
+
+
+def word_to_bits(word, size):
+    '''Renders a word (an int of `size` bits) as a string of '0's and '1's,
+    most significant bit first.
+
+    Raises a ValueError if the word does not fit in `size` bits.'''
+    word = int(word)
+    if not 0 <= word < 1 << size:
+        raise ValueError("'{0}' is not a {1}-bit word".format(word, size))
+    if size == 8:
+        return BYTE_TO_BITS[word]
+    return format(word, '0{0}b'.format(size))
+
+
+def bits_to_word(bits):
+    '''Packs a sequence of bits (most significant first) into an int'''
+    word = 0
+    for b in bits:
+        word = word << 1 | (b == '1' or b == 1)
+    return word
+
+
+class BitBuffer(object):
+    '''
+    Growable buffer of bits packed eight per byte (most significant bit
+    first). Appending a bit is O(1) amortized and the buffer can be rendered
+    back (or partially) as a string of '0's and '1's. The oldest bits can be
+    discarded to bound the memory used by the buffer.
+
+    The packed bytes can be looked at without copying them (see
+    `packed_view`). The storage is never resized in place (it is replaced by
+    a bigger one when it fills up), so outstanding views never prevent the
+    buffer from growing.
+    '''
+    INITIAL_CAPACITY = 64
+
+    def __init__(self, bits=''):
+        # packed contents (only the first (_length + 7) // 8 bytes are used,
+        # the rest are kept at zero)
+        self._data = bytearray(self.INITIAL_CAPACITY)
+        # number of bits in the packed contents (the last byte may be
+        # partially used)
+        self._length = 0
+        # position of the first bit that has not been discarded (always
+        # within the first byte)
+        self._start = 0
+        self.extend(bits)
+
+    def __len__(self):
+        return self._length - self._start
+
+    def append(self, bit):
+        '''Appends one bit to the buffer.
+
+        Raises a ValueError if the symbol is not a bit.'''
+        if bit == '1' or bit == 1:
+            value = 1
+        elif bit == '0' or bit == 0:
+            value = 0
+        else:
+            raise ValueError("'{0}' is not a bit".format(bit))
+        length = self._length
+        if length == len(self._data) << 3:
+            self._reallocate(0, 2 * len(self._data))
+        if value:
+            self._data[length >> 3] |= 0x80 >> (length & 7)
+        self._length = length + 1
+
+    def extend(self, bits):
+        for b in bits:
+            self.append(b)
+
+    def clear(self):
+        self._data = bytearray(self.INITIAL_CAPACITY)
+        self._length = 0
+        self._start = 0
+
+    def discard(self, n):
+        '''Discards the n oldest bits.'''
+        start = min(self._start + n, self._length)
+        # drop the whole bytes (the buffer stays contiguous)
+        if start >= 8:
+            self._reallocate(start >> 3, len(self._data))
+        self._length -= start & ~7
+        self._start = start & 7
+
+    def _reallocate(self, first_byte, capacity):
+        '''Moves the used bytes from first_byte on to a new storage'''
+        used = (self._length + 7) >> 3
+        data = bytearray(capacity)
+        data[:used - first_byte] = self._data[first_byte:used]
+        self._data = data
+
+    def packed_view(self):
+        '''
+        Returns a read-only memoryview over the bytes that hold the bits (the
+        first one starts at `get_bit_offset()` within the first byte, and the
+        last byte may be partially used).
+
+        The view is not a copy: it reflects the buffer as it is when the view
+        is taken, and it should not be kept after new bits are appended.
+        Python < 3.8 cannot make a view of the buffer read-only, so there
+        the view is over a copy of the bytes instead.
+        '''
+        view = memoryview(self._data)[:(self._length + 7) >> 3]
+        try:
+            return view.toreadonly()
+        except AttributeError:
+            return memoryview(view.tobytes())
+
+    def get_bit_offset(self):
+        '''Returns the position of the first bit in the first packed byte'''
+        return self._start
+
+    def to_string(self, start=0, end=None):
+        '''Renders the bits in the range [start, end) as a string.'''
+        start += self._start
+        if end is None or end + self._start > self._length:
+            end = self._length
+        else:
+            end += self._start
+        if start >= end:
+            return ''
+        first_byte, last_byte = start >> 3, (end + 7) >> 3
+        if last_byte - first_byte == 1:
+            # short ranges (the usual case) live within a single byte
+            bits = BYTE_TO_BITS[self._data[first_byte]]
+        else:
+            bits = ''.join(map(BYTE_TO_BITS.__getitem__,
+                               self._data[first_byte:last_byte]))
+        offset = first_byte << 3
+        return bits[start - offset:end - offset]
+
+
+class SymbolBuffer(object):
+    '''
+    Growable buffer of arbitrary symbols, with the same interface as
+    `BitBuffer`. It is used when the channel does not transport bits (e.g.
+    with the `IdentitySerializer`, which sends whole characters).
+    '''
+    def __init__(self, symbols=''):
+        self._data = list(symbols)
+
+    def __len__(self):
+        return len(self._data)
+
+    def append(self, symbol):
+        # symbols are stored character by character so the length of the
+        # buffer matches the length of its string rendering
+        self._data.extend(symbol)
+
+    def extend(self, symbols):
+        for s in symbols:
+            self.append(s)
+
+    def clear(self):
+        self._data = []
+
+    def discard(self, n):
+        '''Discards the n oldest symbols.'''
+        del self._data[:n]
+
+    def to_string(self, start=0, end=None):
+        '''Renders the symbols in the range [start, end) as a string.'''
+        return ''.join(self._data[start:end])
@@ -10,56 +10,130 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 from core.obs.observer import Observable
+from core.buffers import BitBuffer, SymbolBuffer
+from core.serializer import _import_numpy
+from collections import deque
+import core.trace as trace
 import logging
 
+_tracer = trace.get_tracer('channels')
+
 
 class InputChannel:
+    '''
+    Receives bits and deserializes them.
 
-    def __init__(self, serializer):
+    If max_history is given, only (at least) the last max_history bits and
+    characters are kept. The oldest ones are discarded whenever twice as many
+    have accumulated, so the cost stays amortized O(1) per bit.
+    '''
+
+    def __init__(self, serializer, max_history=None):
         self.serializer = serializer
-        # remembers the input in binary format
-        self._binary_buffer = ''
+        self._max_history = max_history
+        # remembers the input in binary format (packed, see `BitBuffer`)
+        self._binary_buffer = BitBuffer()
+        # string rendering of the binary buffer, built lazily on demand
+        self._binary_str = ''
         # leftmost deserialization of the binary buffer
         self._deserialized_buffer = ''
         # remember the position until which we deserialized the binary buffer
         self._deserialized_pos = 0
+        # stateful deserializer that is fed bit by bit (if the serializer
+        # provides one, otherwise we deserialize the undeserialized chunk)
+        try:
+            self._decoder = serializer.incremental_decoder()
+        except AttributeError:
+            self._decoder = None
 
-        # event that gets fired for every new bit
+        # event that gets fired for every new bit (with the whole sequence)
         self.sequence_updated = Observable()
-        # event that gets fired for every new character
+        # event that gets fired for every new character (with the whole text)
         self.message_updated = Observable()
+        # delta versions of the events above: they get fired with the newly
+        # appended bit/text and its offset in the (retained) sequence/text
+        self.sequence_appended = Observable()
+        self.message_appended = Observable()
 
     def consume_bit(self, input_bit):
         '''
         Takes a bit into the channel
         '''
-        # for now we are storing the input as strings (let's change this later)
         if input_bit == 0 or input_bit == 1:
             input_bit = str(input_bit)
         # store the bit in the binary input buffer
-        self._binary_buffer += input_bit
-        # notify the updated sequence
-        self.sequence_updated(self._binary_buffer)
+        self._append_to_binary_buffer(input_bit)
+        if self._max_history is not None and \
+                len(self._binary_buffer) > 2 * self._max_history:
+            self._discard_bits(len(self._binary_buffer) - self._max_history)
+        if self.sequence_appended.observers:
+            self.sequence_appended(input_bit, len(self._binary_buffer) - 1)
+        # notify the updated sequence (only rendering it if someone listens)
+        if self.sequence_updated.observers:
+            self.sequence_updated(self.get_binary())
+
+        if self._decoder:
+            text = self._decoder.decode_bit(input_bit)
+            if text is not None:
+                # everything we received up to now has been deserialized
+                self._deserialized_pos = len(self._binary_buffer)
+                self._append_text(text)
+            return
 
         # we check if we can deserialize the final part of the sequence
         undeserialized_part = self.get_undeserialized()
         if self.serializer.can_deserialize(undeserialized_part):
-            # when we do, we deserialize the chunk
-            self._deserialized_buffer += \
-                self.serializer.to_text(undeserialized_part)
             # we update the position
             self._deserialized_pos += len(undeserialized_part)
+            # when we do, we deserialize the chunk
+            self._append_text(self.serializer.to_text(undeserialized_part))
+
+    def _discard_bits(self, n):
+        self._binary_buffer.discard(n)
+        self._binary_str = self._binary_str[n:]
+        # undeserialized bits can be lost too (e.g. garbage from the learner)
+        self._deserialized_pos = max(0, self._deserialized_pos - n)
 
+    def _append_text(self, text):
+        if self._max_history is not None and \
+                len(self._deserialized_buffer) + len(text) > \
+                2 * self._max_history:
+            self._deserialized_buffer = \
+                self._deserialized_buffer[-self._max_history:]
+        offset = len(self._deserialized_buffer)
+        self._deserialized_buffer += text
+        if self.message_appended.observers:
+            self.message_appended(text, offset)
+        if self.message_updated.observers:
             self.message_updated(self._deserialized_buffer)
 
+    def _append_to_binary_buffer(self, input_bit):
+        try:
+            self._binary_buffer.append(input_bit)
+        except ValueError:
+            # the channel is not transporting bits (e.g. the IdentitySerializer
+            # sends whole characters), so we stop packing the buffer
+            self._binary_buffer = SymbolBuffer(
+                self._binary_buffer.to_string())
+            self._binary_buffer.append(input_bit)
+
     def clear(self):
         '''Clears all the  buffers'''
         self._set_deserialized_buffer('')
         self._set_binary_buffer('')
         self._deserialized_pos = 0
+        if self._decoder:
+            self._decoder.reset()
 
     def get_binary(self):
-        return self._binary_buffer
+        # extend the cached rendering with the bits that arrived since the
+        # last call. The cached string is detached from the instance before
+        # extending it so the interpreter can grow it in place.
+        binary_str, self._binary_str = self._binary_str, ''
+        if len(binary_str) < len(self._binary_buffer):
+            binary_str += self._binary_buffer.to_string(len(binary_str))
+        self._binary_str = binary_str
+        return binary_str
 
     def set_deserialized_buffer(self, new_buffer):
         '''
@@ -71,18 +145,25 @@ class InputChannel:
         '''
         Returns the yet non deserialized chunk in the input
         '''
-        return self._binary_buffer[self._deserialized_pos:]
+        return self._binary_buffer.to_string(self._deserialized_pos)
 
     def get_text(self):
         return self._deserialized_buffer
 
+    def get_view(self):
+        '''Returns a read-only view over the contents of the channel'''
+        return ChannelView(self)
+
     def _set_binary_buffer(self, new_buffer):
         '''
         Carefully raise the event only if the buffer has actually changed
         '''
-        if self._binary_buffer != new_buffer:
-            self._binary_buffer = new_buffer
-            self.sequence_updated(self._binary_buffer)
+        if self.get_binary() != new_buffer:
+            self._binary_buffer = BitBuffer()
+            self._binary_str = ''
+            for b in new_buffer:
+                self._append_to_binary_buffer(b)
+            self.sequence_updated(self.get_binary())
 
     def _set_deserialized_buffer(self, new_buffer):
         '''
@@ -93,66 +174,207 @@ class InputChannel:
             self.message_updated(self._deserialized_buffer)
 
 
+class ChannelView:
+    '''
+    Read-only access to what an `InputChannel` has received, without copying
+    the bits or deserializing them again. The view follows the channel: it
+    always shows its current contents (e.g. it gets empty when the channel
+    is cleared), but the buffers returned by its methods are only valid
+    until the channel receives its next bit.
+    '''
+    def __init__(self, channel):
+        self._channel = channel
+
+    def __len__(self):
+        '''Number of bits (or symbols) in the channel'''
+        return len(self._channel._binary_buffer)
+
+    def get_text(self):
+        '''Returns the text that has been deserialized so far'''
+        return self._channel.get_text()
+
+    def get_packed(self):
+        '''
+        Returns a read-only memoryview over the bits packed eight per byte
+        (most significant bit first), starting at `get_bit_offset()` within
+        the first byte. On Python < 3.8 the view is over a copy of the bits
+        (see `BitBuffer.packed_view`).
+
+        Raises a TypeError if the channel does not transport bits.
+        '''
+        buffer = self._channel._binary_buffer
+        if not isinstance(buffer, BitBuffer):
+            raise TypeError("The channel does not transport bits")
+        return buffer.packed_view()
+
+    def get_bit_offset(self):
+        '''Returns the position of the first bit in the first packed byte'''
+        buffer = self._channel._binary_buffer
+        return buffer.get_bit_offset() if isinstance(buffer, BitBuffer) \
+            else 0
+
+    def get_packed_array(self):
+        '''Numpy version of `get_packed` (a read-only uint8 array, which
+        shares the memory of the channel where the view does)'''
+        np = _import_numpy()
+        arr = np.frombuffer(self.get_packed(), dtype=np.uint8)
+        arr.flags.writeable = False
+        return arr
+
+    def get_bits_array(self):
+        '''
+        Returns the bits as a numpy array of uint8 (one 0/1 value per bit).
+        Unlike the packed versions, this one is unpacked into a new array.
+        '''
+        np = _import_numpy()
+        offset = self.get_bit_offset()
+        return np.unpackbits(self.get_packed_array())[
+            offset:offset + len(self)]
+
+
 class OutputChannel:
 
     def __init__(self, serializer):
         self.serializer = serializer
-        # remembers the data that has to be shipped out
-        self._binary_buffer = ''
+        # queue of encoded messages that have to be shipped out. If the
+        # serializer can encode the symbols one by one, each chunk is the
+        # encoding of a single symbol, so symbol boundaries are chunk
+        # boundaries.
+        self._chunks = deque()
+        # position of the next bit to ship within the first chunk
+        self._cursor = 0
+        try:
+            self._encode_symbols = serializer.to_binary_symbols
+        except AttributeError:
+            self._encode_symbols = None
+        # encoding of the silence token (computed on first use) and number
+        # of queued chunks that are not made of silence only
+        self._silent_bits = None
+        self._n_loud_chunks = 0
         # event that gets fired every time we change the output sequence
         self.sequence_updated = Observable()
         self.logger = logging.getLogger(__name__)
 
     def set_message(self, message):
+        if self._encode_symbols is None:
+            self._set_message_scan(message)
+            return
+        new_chunks = self._encode_symbols(message)
+        old_binary = self.get_binary() \
+            if self.sequence_updated.observers else None
+        # the new message replaces everything that comes after the symbol
+        # that is currently being shipped (if any)
+        if self._cursor > 0:
+            if _tracer.enabled:
+                _tracer.emit('insert', position=len(self._chunks[0]) -
+                             self._cursor)
+            new_chunks.insert(0, self._chunks[0])
+        self._set_chunks(new_chunks)
+        if old_binary is not None and old_binary != self.get_binary():
+            self._notify_sequence_updated()
+
+    def _set_message_scan(self, message):
         new_binary = self.serializer.to_binary(message)
+        binary_buffer = self.get_binary()
         # find the first available point from where we can insert
         # the new buffer without breaking the encoding
-        insert_point = len(self._binary_buffer)
-        for i in range(len(self._binary_buffer)):
+        insert_point = len(binary_buffer)
+        for i in range(len(binary_buffer)):
             # if we can decode from insert_point on, we can replace
             # that information with the new buffer
-            if self.serializer.to_text(self._binary_buffer[i:]):
+            if self.serializer.to_text(binary_buffer[i:]):
                 insert_point = i
                 break
-        if insert_point > 0:
-            self.logger.debug("Inserting new contents at {0}".format(
-                insert_point))
-        self._set_buffer(self._binary_buffer[:insert_point] + new_binary)
+        if insert_point > 0 and _tracer.enabled:
+            _tracer.emit('insert', position=insert_point)
+        self._set_chunks([chunk for chunk in
+                          (binary_buffer[:insert_point], new_binary)
+                          if chunk])
+        self._cursor = 0
+        if binary_buffer != binary_buffer[:insert_point] + new_binary:
+            self._notify_sequence_updated()
 
     def add_message(self, message):
-        new_binary = self.serializer.to_binary(message)
-        # append the binary encoding to the end of the current buffer
-        self._set_buffer(self._binary_buffer + new_binary)
+        # queue the binary encoding after the current contents
+        if self._encode_symbols is None:
+            new_chunks = [self.serializer.to_binary(message)]
+        else:
+            new_chunks = self._encode_symbols(message)
+        new_chunks = [chunk for chunk in new_chunks if chunk]
+        if new_chunks:
+            self._chunks.extend(new_chunks)
+            self._n_loud_chunks += sum(1 for chunk in new_chunks
+                                       if self._is_loud(chunk))
+            self._notify_sequence_updated()
+
+    def _set_chunks(self, chunks):
+        self._chunks = deque(chunks)
+        self._n_loud_chunks = sum(1 for chunk in chunks
+                                  if self._is_loud(chunk))
+
+    def _is_loud(self, chunk):
+        '''Tells if a chunk is not just a sequence of silence tokens'''
+        silent_bits = self._get_silent_bits()
+        n_tokens, remainder = divmod(len(chunk), len(silent_bits))
+        return remainder != 0 or chunk != silent_bits * n_tokens
+
+    def _get_silent_bits(self):
+        if self._silent_bits is None:
+            self._silent_bits = self.serializer.to_binary(
+                self.serializer.SILENCE_TOKEN)
+        return self._silent_bits
 
     def clear(self):
-        self._set_buffer('')
+        if self._chunks:
+            self._chunks.clear()
+            self._n_loud_chunks = 0
+            self._cursor = 0
+            self._notify_sequence_updated()
+
+    def get_binary(self):
+        '''
+        Returns the bits that are still to be shipped out
+        '''
+        if not self._chunks:
+            return ''
+        return ''.join(self._chunks)[self._cursor:]
 
-    def _set_buffer(self, new_buffer):
+    def _notify_sequence_updated(self):
         '''
-        Carefully raise the event only if the buffer has actually changed
+        Raise the event with the pending bits (only rendering them if someone
+        listens)
         '''
-        if self._binary_buffer != new_buffer:
-            self._binary_buffer = new_buffer
-            self.sequence_updated(self._binary_buffer)
+        if self.sequence_updated.observers:
+            self.sequence_updated(self.get_binary())
 
     def consume_bit(self):
-        if len(self._binary_buffer) > 0:
-            output, new_buffer = self._binary_buffer[0], \
-                self._binary_buffer[1:]
-            self._set_buffer(new_buffer)
+        if self._chunks:
+            chunk = self._chunks[0]
+            output = chunk[self._cursor]
+            self._cursor += 1
+            if self._cursor == len(chunk):
+                # we are done with this chunk
+                self._chunks.popleft()
+                self._cursor = 0
+                if self._n_loud_chunks and self._is_loud(chunk):
+                    self._n_loud_chunks -= 1
+            self._notify_sequence_updated()
             return output
 
     def is_empty(self):
-        return len(self._binary_buffer) == 0
+        return not self._chunks
 
     def is_silent(self):
         ''' All the bits in the output token are the result of serializing
         silence tokens'''
-        buf = self._binary_buffer
-        silent_bits = self.serializer.to_binary(self.serializer.SILENCE_TOKEN)
-        token_size = len(silent_bits)
-        while len(buf) > token_size:
-            buf_suffix, buf = buf[-token_size:], buf[:-token_size]
-            if buf_suffix != silent_bits:
-                return False
-        return len(buf) == 0 or buf == silent_bits[-len(buf):]
+        if not self._n_loud_chunks:
+            return True
+        head = self._chunks[0]
+        if self._n_loud_chunks > 1 or not self._is_loud(head):
+            return False
+        # only the chunk being shipped is loud: what is left of it may still
+        # be the tail of a silence token
+        pending = head[self._cursor:]
+        silent_bits = self._get_silent_bits()
+        n_tokens = len(pending) // len(silent_bits) + 1
+        return pending == (silent_bits * n_tokens)[-len(pending):]
@@ -13,11 +13,16 @@ from core.events import EventManager
 from core.task import StateChanged, MessageReceived, \
     SequenceReceived, OutputSequenceUpdated, OutputMessageUpdated
 from core.obs.observer import Observable
-from core.serializer import ScramblingSerializerWrapper
+from core.serializer import ScramblingSerializerWrapper, IdentitySerializer
 from core.channels import InputChannel, OutputChannel
+from core.buffers import word_to_bits, bits_to_word, is_bit
+import core.trace as trace
 from collections import defaultdict
+import contextlib
 import logging
 
+_tracer = trace.get_tracer('environment')
+
 
 class Environment:
     '''
@@ -33,9 +38,20 @@ class Environment:
         scrambled.
     :param max_reward_per_task: maximum amount of reward that a learner can
         receive for a given task.
+    :param scramble_dictionary: a ScrambleDictionary with the pseudo-words
+        used to scramble the words (only used if scramble is True).
+    :param granularity: 'bit' to exchange one bit of the serialized messages
+        per step, 'symbol' to exchange one whole character per step, or an
+        int k to exchange a word of k bits (as an int) per step. In symbol
+        and word modes the time still advances by the number of bits that a
+        step stands for, so the tasks' time limits keep their meaning.
+    :param max_history: if not None, the maximum number of bits and
+        characters from the current task that the input channels are
+        guaranteed to keep (older ones may be discarded).
     '''
     def __init__(self, serializer, task_scheduler, scramble=False,
-                 max_reward_per_task=10):
+                 max_reward_per_task=10, scramble_dictionary=None,
+                 granularity='bit', max_history=None):
         # save parameters into member variables
         self._task_scheduler = task_scheduler
         self._serializer = serializer
@@ -50,14 +66,38 @@ class Environment:
         # intialize member variables
         self._current_task = None
         self._current_world = None
+        self.granularity = granularity
+        # number of bits packed in the words exchanged with the learner
+        self._word_size = None
+        if granularity == 'bit':
+            self._time_scale = 1
+        elif granularity == 'symbol':
+            # the channels carry the characters themselves
+            self._time_scale = len(serializer.to_binary(
+                serializer.SILENCE_TOKEN))
+            serializer = IdentitySerializer()
+        elif isinstance(granularity, int) and not isinstance(
+                granularity, bool) and granularity > 0:
+            # the channels still carry bits, which are grouped in words of
+            # k bits on their way to and from the learner
+            if hasattr(serializer, 'to_binary') and not all(
+                    is_bit(b) for b in serializer.to_binary(
+                        serializer.SILENCE_TOKEN)):
+                raise ValueError("Word granularity requires a serializer "
+                                 "that produces bits")
+            self._word_size = granularity
+            self._time_scale = 1
+        else:
+            raise ValueError("Unknown granularity '{0}'".format(granularity))
         # we hear to our own output
-        self._output_channel_listener = InputChannel(serializer)
+        self._output_channel_listener = InputChannel(serializer, max_history)
         if scramble:
-            serializer = ScramblingSerializerWrapper(serializer)
+            serializer = ScramblingSerializerWrapper(
+                serializer, dictionary=scramble_dictionary)
         # output channel
         self._output_channel = OutputChannel(serializer)
         # input channel
-        self._input_channel = InputChannel(serializer)
+        self._input_channel = InputChannel(serializer, max_history)
         # priority of ongoing message
         self._output_priority = 0
         # reward that is to be given at the learner at the end of the task
@@ -66,6 +106,10 @@ class Environment:
         self._task_time = None
         # Task deinitialized
         self._current_task_deinitialized = False
+        # depth of the ongoing state transactions and the tasks or worlds
+        # whose state changed within them (see `state_transaction`)
+        self._state_transactions = 0
+        self._changed_scripts = []
         # Internal logger
         self.logger = logging.getLogger(__name__)
 
@@ -74,19 +118,49 @@ class Environment:
         self.task_updated = Observable()
         self.reward_given = Observable()
 
-        # Register channel observers
-        self._input_channel.sequence_updated.register(
-            self._on_input_sequence_updated)
-        self._input_channel.message_updated.register(
-            self._on_input_message_updated)
-        self._output_channel_listener.sequence_updated.register(
-            self._on_output_sequence_updated)
-        self._output_channel_listener.message_updated.register(
-            self._on_output_message_updated)
+        # channel observers that feed each type of event. They are only
+        # registered while some trigger listens for their events, so the
+        # channels skip the notifications (and no events are built) for the
+        # types that no task handles
+        self._event_feeds = {
+            SequenceReceived: (self._input_channel.sequence_appended,
+                               self._on_input_sequence_appended),
+            MessageReceived: (self._input_channel.message_appended,
+                              self._on_input_message_appended),
+            OutputSequenceUpdated: (
+                self._output_channel_listener.sequence_appended,
+                self._on_output_sequence_appended),
+            OutputMessageUpdated: (
+                self._output_channel_listener.message_appended,
+                self._on_output_message_appended),
+        }
+        self.event_manager.listeners_changed.register(
+            self._on_listeners_changed)
 
     def next(self, learner_input, test_mode=False):
-        '''Main loop of the Environment. Receives one bit from the learner and
-        produces a response (also one bit)'''
+        '''Main loop of the Environment. Receives one bit (or one character in
+        symbol granularity, or one k-bit word in word granularity) from the
+        learner and produces a response (also one bit, character or word)'''
+        if self._word_size is None:
+            return self._step(learner_input, test_mode)
+        # a word is exchanged as k consecutive bit steps, so the tasks see
+        # exactly the same stream as in bit granularity
+        if learner_input is None:
+            input_bits = [None] * self._word_size
+        else:
+            input_bits = word_to_bits(learner_input, self._word_size)
+        output_bits = []
+        reward = None
+        for bit in input_bits:
+            output, bit_reward = self._step(bit, test_mode)
+            output_bits.append(output)
+            if bit_reward is not None:
+                reward = bit_reward if reward is None else reward + bit_reward
+        return bits_to_word(output_bits), reward
+
+    def _step(self, learner_input, test_mode):
+        if trace.active:
+            trace.step()
         # Make sure we have a task
         if not self._current_task:
             self._switch_new_task(train_mode=not(test_mode))
@@ -139,10 +213,38 @@ class Environment:
         self._output_channel_listener.consume_bit(output)
 
         # advance time
-        self._task_time += 1
+        self._task_time += self._time_scale
 
         return output, reward
 
+    def get_word_size(self):
+        '''
+        Returns the number of bits in the words exchanged on every step, or
+        None if the environment does not exchange words.
+        '''
+        return self._word_size
+
+    def get_time_scale(self):
+        '''
+        Returns how much the task time advances on every step (the number of
+        bits that a step stands for).
+        '''
+        return self._time_scale * (self._word_size or 1)
+
+    def get_output_view(self):
+        '''
+        Returns a read-only view over what the environment has said in the
+        current task (see `ChannelView`).
+        '''
+        return self._output_channel_listener.get_view()
+
+    def get_input_view(self):
+        '''
+        Returns a read-only view over what the learner has said in the
+        current task (see `ChannelView`).
+        '''
+        return self._input_channel.get_view()
+
     def get_reward_per_task(self):
         '''
         Returns a dictonary that contains the cumulative reward for each
@@ -167,56 +269,145 @@ class Environment:
         '''
         return self._output_channel.is_silent()
 
-    def _on_input_sequence_updated(self, sequence):
-        if self.event_manager.raise_event(SequenceReceived(sequence)):
-            self.logger.debug("Sequence received by running task: '{0}'".format(
-                sequence))
+    def _on_listeners_changed(self, event_type, listened):
+        if event_type not in self._event_feeds:
+            return
+        observable, callback = self._event_feeds[event_type]
+        if listened:
+            observable.register(callback)
+        else:
+            observable.deregister(callback)
+
+    def _on_input_sequence_appended(self, bit, offset):
+        event = SequenceReceived(render=self._sequence_renderer(
+            self._input_channel, offset + 1))
+        if self.raise_event(event) and _tracer.enabled:
+            _tracer.emit('sequence_received', sequence=event.sequence)
 
-    def _on_input_message_updated(self, message):
+    def _on_input_message_appended(self, text, offset):
         # send the current received message to the task
-        if self.event_manager.raise_event(MessageReceived(
-                message)):
-            self.logger.debug("Message received by running task: '{0}'".format(
-                message))
+        message = self._input_channel.get_text()
+        if self.raise_event(MessageReceived(message)) and _tracer.enabled:
+            _tracer.emit('message_received', message=message)
+
+    def _on_output_sequence_appended(self, bit, offset):
+        self.raise_event(OutputSequenceUpdated(
+            render=self._sequence_renderer(self._output_channel_listener,
+                                           offset + 1)))
 
-    def _on_output_sequence_updated(self, sequence):
-        self.event_manager.raise_event(OutputSequenceUpdated(sequence))
+    def _on_output_message_appended(self, text, offset):
+        self.raise_event(OutputMessageUpdated(
+            self._output_channel_listener.get_text()))
 
-    def _on_output_message_updated(self, message):
-        self.event_manager.raise_event(OutputMessageUpdated(message))
+    def _sequence_renderer(self, channel, length):
+        '''
+        Returns a function that renders the first `length` bits that the
+        channel received.
+        '''
+        return lambda: channel.get_binary()[:length]
 
     def set_reward(self, reward, message='', priority=0):
         '''Sets the reward that is going to be given
         to the learner once the task has sent all the remaining message'''
+        if self._changed_scripts:
+            self._commit_state_changes()
         self._reward = reward
-        self.logger.debug('Setting reward {0} with message "{1}"'
-                          ' and priority {2}'
-                          .format(reward, message, priority))
+        if _tracer.enabled:
+            _tracer.emit('set_reward', reward=reward, message=message,
+                         priority=priority)
         self.set_message(message, priority)
 
     def add_message(self, message):
-        self.logger.debug('Appending message "{0}" with priority {1}'
-                           .format(message, self._output_priority))
+        if self._changed_scripts:
+            self._commit_state_changes()
+        if _tracer.enabled:
+            _tracer.emit('add_message', message=message,
+                         priority=self._output_priority)
         self._output_channel.add_message(message)
 
     def set_message(self, message, priority=0):
         ''' Saves the message in the output buffer so it can be delivered
         bit by bit. It overwrites any previous content.
         '''
+        if self._changed_scripts:
+            self._commit_state_changes()
         if self._output_channel.is_empty() or priority >= self._output_priority:
-            self.logger.debug('Setting message "{0}" with priority {1}'
-                               .format(message, priority))
+            if _tracer.enabled:
+                _tracer.emit('set_message', message=message,
+                             priority=priority)
             self._output_channel.set_message(message)
             self._output_priority = priority
         else:
             self.logger.info(
-                'Message "{0}" blocked because of '
-                'low priority ({1}<{2}) '.format(
-                    message, priority, self._output_priority)
-            )
+                'Message "%s" blocked because of low priority (%s<%s) ',
+                message, priority, self._output_priority)
 
     def raise_event(self, event):
-        return self.event_manager.raise_event(event)
+        '''
+        Dispatches the event to the registered triggers. The handlers run
+        within a state transaction, so the changes that they make to the
+        states raise a single StateChanged event once they are all done.
+        '''
+        self._state_transactions += 1
+        try:
+            return self.event_manager.raise_event(event)
+        finally:
+            self._end_state_transaction()
+
+    @contextlib.contextmanager
+    def state_transaction(self):
+        '''
+        Context manager that collapses the changes made to the states of the
+        task and the world within it: the StateChanged event (and the
+        notification of the `state_updated` observers) is held until the
+        outermost transaction ends, and it is then raised only once.
+
+        The held changes are committed earlier if a message or a reward is
+        set in the meantime, so the reactions to the changes keep their order
+        with respect to the messages (as if they were raised right away).
+        '''
+        self._state_transactions += 1
+        try:
+            yield
+        finally:
+            self._end_state_transaction()
+
+    def _end_state_transaction(self):
+        self._state_transactions -= 1
+        if self._state_transactions == 0 and self._changed_scripts:
+            self._commit_state_changes()
+
+    def _commit_state_changes(self):
+        '''Raises the StateChanged event held by the state transactions'''
+        # the handlers of the StateChanged event can change the states
+        # again, which is committed in a further round
+        self._state_transactions += 1
+        try:
+            while self._changed_scripts:
+                scripts, self._changed_scripts = self._changed_scripts, []
+                self._notify_state_changed(scripts)
+        finally:
+            self._state_transactions -= 1
+
+    def state_changed(self, script):
+        '''
+        Reports that the state of a task or a world changed. The StateChanged
+        event is raised right away, or when the ongoing state transaction
+        ends.
+        '''
+        if self._state_transactions:
+            if script not in self._changed_scripts:
+                self._changed_scripts.append(script)
+            return False
+        return self._notify_state_changed([script])
+
+    def _notify_state_changed(self, scripts):
+        ret = self.raise_state_changed()
+        for script in scripts:
+            if script.has_started():
+                # notify (outside) observers
+                script.state_updated(script)
+        return ret
 
     def raise_state_changed(self):
         '''
@@ -295,7 +486,7 @@ class Environment:
         self.task_updated(self._current_task)
 
     def _deregister_task_triggers(self, task):
-        for trigger in task.get_triggers():
+        for trigger in task.get_triggers() + task.get_dynamic_triggers():
             try:
                 self.event_manager.deregister(task, trigger)
             except ValueError:
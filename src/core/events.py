@@ -11,16 +11,160 @@ from __future__ import print_function
 from __future__ import unicode_literals
 from collections import namedtuple
 import logging
+import re
+from core.obs.observer import Observable
+import core.trace as trace
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+try:
+    unichr
+except NameError:  # Python 3
+    unichr = chr
 
 # When a task is started, it will register a set of triggers
 # which, for a specific kind of event (see below) and a further given
 # filtering condition, it will call the specified event_handler function
 Trigger = namedtuple('Trigger', ('type', 'condition', 'event_handler'))
 
+_tracer = trace.get_tracer('events')
+
+# bit that stands for each type of event in the listener bitmaps
+_event_bits = {}
+
+
+def event_bit(event_type):
+    '''Returns the bit assigned to a type of event (a power of two)'''
+    try:
+        return _event_bits[event_type]
+    except KeyError:
+        return _event_bits.setdefault(event_type, 1 << len(_event_bits))
+
+
+class PatternCondition(object):
+    '''
+    Trigger condition that searches a regular expression in one of the fields
+    of the event (it returns the match object, if any).
+
+    The expressions that are anchored at the end of the field (they end with
+    `$` or `\\Z`) get two shortcuts:
+      - if their matches have a bounded length, only the end of the field
+        that can hold them is searched (`window`), so the cost does not grow
+        with the length of the field. The match is the same one that a
+        search over the whole field finds.
+      - if their matches can only end with a few known characters, these
+        are kept in `last_chars`, so the event manager can tell that the
+        condition fails just by looking at the last character of the field
+        (see `EventManager`).
+    '''
+    # longest window worth searching (the longer ones are searched whole)
+    MAX_WINDOW = 1024
+
+    def __init__(self, pattern, field):
+        self.regex = re.compile(pattern)
+        self.field = field
+        self.window = None
+        self.last_chars = None
+        if self.regex.flags & (re.IGNORECASE | re.MULTILINE):
+            return
+        parsed = sre_parse.parse(self.regex.pattern, self.regex.flags)
+        items = list(parsed)
+        if not items or items[-1][0] != sre_constants.AT:
+            return
+        if items[-1][1] == sre_constants.AT_END:
+            # `$` also matches before a newline at the end
+            newline = frozenset('\n')
+        elif items[-1][1] == sre_constants.AT_END_STRING:
+            newline = frozenset()
+        else:
+            return
+        max_width = parsed.getwidth()[1]
+        if max_width <= self.MAX_WINDOW:
+            self.window = max_width + len(newline)
+        chars = self._get_ending_chars(items[:-1])
+        if chars is not None:
+            self.last_chars = chars | newline
+
+    def __call__(self, event):
+        text = getattr(event, self.field)
+        if self.window is None:
+            return self.regex.search(text)
+        # starting the search late (rather than slicing the text) keeps the
+        # context for the assertions and the positions of the match
+        return self.regex.search(text, max(0, len(text) - self.window))
+
+    @classmethod
+    def _get_ending_chars(cls, items):
+        '''
+        Returns the characters with which the matches of the parsed
+        expression can end, or None if they cannot be told.
+        '''
+        if not items:
+            return None
+        op, av = items[-1]
+        if op == sre_constants.LITERAL:
+            return frozenset([unichr(av)])
+        elif op == sre_constants.IN:
+            chars = set()
+            for set_op, set_av in av:
+                if set_op == sre_constants.LITERAL:
+                    chars.add(unichr(set_av))
+                elif set_op == sre_constants.RANGE and \
+                        set_av[1] - set_av[0] < 256:
+                    chars.update(unichr(c)
+                                 for c in range(set_av[0], set_av[1] + 1))
+                else:
+                    # negated sets and categories (e.g. \\w)
+                    return None
+            return frozenset(chars)
+        elif op == sre_constants.SUBPATTERN:
+            # the parsed group comes last (its layout changed over versions)
+            if len(av) == 4 and av[1] & re.IGNORECASE:
+                return None
+            return cls._get_ending_chars(list(av[-1]))
+        elif op == sre_constants.BRANCH:
+            chars = frozenset()
+            for branch in av[1]:
+                branch_chars = cls._get_ending_chars(list(branch))
+                if branch_chars is None:
+                    return None
+                chars |= branch_chars
+            return chars
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) \
+                and av[0] > 0:
+            return cls._get_ending_chars(list(av[2]))
+        return None
+
 
 class EventManager:
+    '''
+    Dispatches the events to the triggers registered for their type.
+
+    For every type of event, the registered triggers are compiled into a
+    dispatch chain the first time that such an event is raised. The chains
+    are dropped whenever the triggers of their type change.
+
+    The regular expressions that must match at the end of a field of the
+    event (`PatternCondition`) are combined into a table indexed by the last
+    character of the field: a single lookup tells which of them can match,
+    and only those are searched.
+
+    The types of events that have some trigger registered are kept in the
+    `listened` bitmap (see `event_bit`), so the sources of the events can
+    check cheaply whether they need to build them at all. The
+    `listeners_changed` signal is fired with the type of event and whether
+    it is listened for when a type gains its first trigger or loses its last.
+    '''
     def __init__(self):
         self.triggers = {}
+        self.listened = 0
+        self.listeners_changed = Observable()
+        # event type -> (whether the event keeps the condition outcome,
+        # tuple of (observer, condition, handler) for each trigger)
+        self._chains = {}
         self.logger = logging.getLogger(__name__)
 
     def register(self, observer, trigger):
@@ -32,43 +176,126 @@ class EventManager:
         # initialize a list for each type of event (it's just an optimizaiton)
         if trigger.type not in self.triggers:
             self.triggers[trigger.type] = []
-        self.logger.debug(
-            "Registering Trigger for {0} event with handler {1} of object of "
-            "type {2}".format(trigger.type.__name__, trigger.event_handler,
-                              observer.__class__.__name__))
+        if _tracer.enabled:
+            _tracer.emit('register', event_type=trigger.type.__name__,
+                         handler=trigger.event_handler,
+                         observer=observer.__class__.__name__)
         # save the trigger
         self.triggers[trigger.type].append((observer, trigger))
+        self._chains.pop(trigger.type, None)
+        if len(self.triggers[trigger.type]) == 1:
+            self._set_listened(trigger.type, True)
 
     def deregister(self, observer, trigger):
         self.triggers[trigger.type].remove((observer, trigger))
+        self._chains.pop(trigger.type, None)
+        if not self.triggers[trigger.type]:
+            self._set_listened(trigger.type, False)
 
     def clear(self):
         '''
         Deregisters all triggers
         '''
+        listened = [t for t, registered in self.triggers.items() if registered]
         self.triggers.clear()
+        self._chains.clear()
+        for event_type in listened:
+            self._set_listened(event_type, False)
+
+    def has_listeners(self, event_type):
+        '''Tells if some trigger is registered for the type of event'''
+        return bool(self.listened & event_bit(event_type))
+
+    def _set_listened(self, event_type, listened):
+        if listened:
+            self.listened |= event_bit(event_type)
+        else:
+            self.listened &= ~event_bit(event_type)
+        self.listeners_changed(event_type, listened)
+
+    def _compile(self, event_type):
+        '''Builds the dispatch chain for a type of event'''
+        # only the events that declare it get the outcome of the condition
+        # (e.g. to retrieve the groups matched by a regular expression)
+        keeps_outcome = hasattr(event_type, 'condition_outcome')
+        registered = self.triggers.get(event_type, ())
+        matcher, keys = self._build_matcher(
+            [trigger.condition for observer, trigger in registered])
+        links = tuple((observer, trigger.condition, trigger.event_handler,
+                       key)
+                      for (observer, trigger), key in zip(registered, keys))
+        chain = (keeps_outcome, links, matcher)
+        self._chains[event_type] = chain
+        return chain
+
+    @staticmethod
+    def _build_matcher(conditions):
+        '''
+        Builds a table from the last character of a field of the event to
+        the conditions (by their position) that can hold when the field ends
+        with it. Only the end-anchored expressions with known last characters
+        take part (see `PatternCondition`), and they must all look at the
+        same field.
+
+        Returns the field and the table (or None if no condition takes part)
+        and the key of each condition (None if it does not take part).
+        '''
+        keys = [None] * len(conditions)
+        indexed = [(i, c) for i, c in enumerate(conditions)
+                   if isinstance(c, PatternCondition) and
+                   c.last_chars is not None]
+        fields = set(c.field for i, c in indexed)
+        if len(fields) != 1:
+            return None, keys
+        table = {}
+        for i, condition in indexed:
+            keys[i] = i
+            for c in condition.last_chars:
+                table.setdefault(c, set()).add(i)
+        table = dict((c, frozenset(s)) for c, s in table.items())
+        return (fields.pop(), table), keys
 
     def raise_event(self, event):
+        event_type = event.__class__
+        chain = self._chains.get(event_type)
+        if chain is None:
+            chain = self._compile(event_type)
+        keeps_outcome, links, matcher = chain
+        if matcher is not None:
+            # the conditions that can hold given the last character
+            field, table = matcher
+            candidates = table.get(getattr(event, field)[-1:], ())
         handled = False
-        # check if we have any trigger at all of this type of event
-        if event.__class__ in self.triggers:
-            # for all the triggers registered for this type of event
-            for observer, trigger in self.triggers[event.__class__]:
-                # check if the filtering condition is a go
-                condition_outcome = trigger.condition(event)
-                if condition_outcome:
-                    # save, if the event expects it, the outcome of the
-                    # condition checking
-                    try:
-                        event.condition_outcome = condition_outcome
-                    except AttributeError:
-                        self.logger.debug("Couldn't save condition outcome for "
-                                          "event {0}".format(event))
-                    self.logger.debug('{0} handled by {1}'.format(
-                        event, trigger.event_handler))
-                    # call the event handler
-                    trigger.event_handler(observer, event)
-                    # remember we handled the event and
-                    # keep on processing other events
-                    handled = True
+        # if a handler changes the triggers for this type of event, the rest
+        # of the chain only runs the triggers that are still registered
+        changed = False
+        for observer, condition, event_handler, key in links:
+            if key is not None and key not in candidates:
+                continue
+            if changed and not self._is_registered(event_type, observer,
+                                                   event_handler):
+                continue
+            # check if the filtering condition is a go
+            condition_outcome = condition(event)
+            if condition_outcome:
+                # save, if the event expects it, the outcome of the
+                # condition checking
+                if keeps_outcome:
+                    event.condition_outcome = condition_outcome
+                if _tracer.enabled:
+                    _tracer.emit('handled', event=event, handler=event_handler)
+                # call the event handler
+                event_handler(observer, event)
+                # remember we handled the event and
+                # keep on processing other events
+                handled = True
+                if self._chains.get(event_type) is not chain:
+                    changed = True
         return handled
+
+    def _is_registered(self, event_type, observer, event_handler):
+        for registered_observer, trigger in self.triggers.get(event_type, ()):
+            if registered_observer is observer and \
+                    trigger.event_handler is event_handler:
+                return True
+        return False
@@ -0,0 +1,262 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree. An additional grant
+# of patent rights can be found in the PATENTS file in the same directory.
+
+'''
+Scramble dictionaries: pre-generated pseudo-words for the
+`ScramblingSerializerWrapper`.
+
+A dictionary holds a fixed mapping for a known vocabulary and, for the words
+outside of it, pools of unused pseudo-words bucketed by length. It is stored
+in a compact binary file that is memory-mapped read-only, so every worker of a
+multi-process run shares the same vocabulary without generating it.
+
+To build a dictionary from the words found in some text files::
+
+    python -m core.scramble_dictionary -o words.dict [-s SEED] file ...
+'''
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from optparse import OptionParser
+import io
+import math
+import mmap
+import random
+import re
+import string
+import struct
+
+VOWELS = 'aeiouy'
+CONSONANTS = ''.join([i for i in string.ascii_lowercase if i not in VOWELS])
+
+
+def draw_pseudo_word(rnd, L, readable=True):
+    '''Draws a random pseudo-word of length L with the random generator rnd'''
+    if readable:
+        # alternating between vowels and consonants, sampled with repl.
+        _choice, _range = rnd.choice, range(int(math.ceil(L / 2)))
+        v = [_choice(VOWELS) for i in _range]
+        c = [_choice(CONSONANTS) for i in _range]
+        zipped = zip(v, c) if rnd.getrandbits(1) else zip(c, v)
+        return ''.join([a for b in zipped for a in b])[:L]
+    else:
+        return ''.join(rnd.sample(string.ascii_lowercase, L))
+
+
+class ScrambleDictionary:
+    '''
+    Read-only view over a serialized scramble dictionary.
+
+    File layout (big-endian):
+      - header: magic, key width, value width, number of words and maximum
+        length of the pooled pseudo-words
+      - for each length, the offset and size of its pool
+      - the (word, pseudo-word) records sorted by word
+      - the (pseudo-word, word) records sorted by pseudo-word
+      - the pools: pseudo-words of the same length stored back to back
+    Words and pseudo-words are UTF-8 encoded and padded with null bytes to
+    the width of their column.
+    '''
+    MAGIC = b'CSD1'
+    HEADER = struct.Struct(str('>4sIIII'))
+    POOL_ENTRY = struct.Struct(str('>II'))
+
+    def __init__(self, data):
+        '''
+        Args:
+            data: the serialized dictionary (a bytes-like object or a mmap).
+        '''
+        self._data = data
+        magic, self._key_width, self._value_width, self._n_words, \
+            self.max_length = self.HEADER.unpack_from(data, 0)
+        if magic != self.MAGIC:
+            raise ValueError("Not a scramble dictionary")
+        offset = self.HEADER.size
+        self._pools = [(0, 0)]
+        for L in range(1, self.max_length + 1):
+            self._pools.append(self.POOL_ENTRY.unpack_from(data, offset))
+            offset += self.POOL_ENTRY.size
+        record_size = self._key_width + self._value_width
+        self._forward_offset = offset
+        self._inverse_offset = offset + self._n_words * record_size
+        # position of the next pseudo-word to draw from each pool (this is
+        # the only state, and it is local to the process)
+        self._next = [0] * (self.max_length + 1)
+
+    def __len__(self):
+        return self._n_words
+
+    def get_pseudo_word(self, word):
+        '''Returns the pseudo-word assigned to word or None if it has none'''
+        return self._lookup(self._forward_offset, self._key_width,
+                            self._value_width, word)
+
+    def get_word(self, pseudo_word):
+        '''Returns the word that is assigned pseudo_word or None'''
+        return self._lookup(self._inverse_offset, self._value_width,
+                            self._key_width, pseudo_word)
+
+    def draw_pseudo_word(self, L, used=()):
+        '''
+        Returns an unused pseudo-word of length L, or a longer one if the pool
+        of that length has run out. Returns None when no pool can provide one.
+
+        Args:
+            used: pseudo-words that must be skipped (e.g. those generated
+            outside of the dictionary).
+        '''
+        for length in range(L, self.max_length + 1):
+            offset, size = self._pools[length]
+            while self._next[length] < size:
+                start = offset + self._next[length] * length
+                self._next[length] += 1
+                pseudo_word = self._decode(self._data[start:start + length])
+                if pseudo_word not in used:
+                    return pseudo_word
+        return None
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self._data[:])
+
+    def _lookup(self, table_offset, key_width, value_width, key):
+        key = self._encode(key, key_width)
+        if key is None:
+            return None
+        data = self._data
+        record_size = key_width + value_width
+        # binary search over the sorted records
+        lo, hi = 0, self._n_words
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = table_offset + mid * record_size
+            mid_key = data[start:start + key_width]
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key > key:
+                hi = mid
+            else:
+                return self._decode(
+                    data[start + key_width:start + record_size])
+        return None
+
+    @staticmethod
+    def _encode(word, width):
+        encoded = word.encode('utf-8')
+        if len(encoded) > width:
+            return None
+        return encoded + b'\0' * (width - len(encoded))
+
+    @staticmethod
+    def _decode(encoded):
+        return bytes(encoded).rstrip(b'\0').decode('utf-8')
+
+
+def generate_dictionary(words=(), seed=0, readable=True, pool_size=1000,
+                        max_length=16):
+    '''
+    Creates a dictionary assigning a pseudo-word to each of the given words
+    (lower-cased) and keeping pools of up to pool_size unused pseudo-words
+    for each length up to max_length. The result only depends on the
+    arguments.
+    '''
+    rnd = random.Random(seed)
+    pools = [[]]
+    for L in range(1, max_length + 1):
+        pool, seen = [], set()
+        # short lengths have few possible words: give up after a while
+        for _ in range(pool_size * 20):
+            if len(pool) == pool_size:
+                break
+            pseudo_word = draw_pseudo_word(rnd, L, readable)
+            if pseudo_word not in seen:
+                seen.add(pseudo_word)
+                pool.append(pseudo_word)
+        # pools are consumed from the end while building the mapping
+        pool.reverse()
+        pools.append(pool)
+    mapping = {}
+    used = set()
+    for word in sorted(set(w.lower() for w in words)):
+        pseudo_word = None
+        for L in range(len(word), max_length + 1):
+            if pools[L]:
+                pseudo_word = pools[L].pop()
+                break
+        while pseudo_word is None or pseudo_word in used:
+            # the word is longer than the pooled ones (or they ran out)
+            pseudo_word = draw_pseudo_word(rnd, len(word), readable)
+        used.add(pseudo_word)
+        mapping[word] = pseudo_word
+    for pool in pools:
+        pool.reverse()
+    return ScrambleDictionary(_serialize(mapping, pools))
+
+
+def _serialize(mapping, pools):
+    key_width = max([len(w.encode('utf-8')) for w in mapping] + [1])
+    value_width = max([len(w.encode('utf-8')) for w in mapping.values()] +
+                      [1])
+    encode = ScrambleDictionary._encode
+    forward = sorted((encode(w, key_width), encode(p, value_width))
+                     for w, p in mapping.items())
+    inverse = sorted((p, w) for w, p in forward)
+    out = io.BytesIO()
+    max_length = len(pools) - 1
+    out.write(ScrambleDictionary.HEADER.pack(
+        ScrambleDictionary.MAGIC, key_width, value_width, len(mapping),
+        max_length))
+    offset = ScrambleDictionary.HEADER.size + \
+        max_length * ScrambleDictionary.POOL_ENTRY.size + \
+        2 * len(mapping) * (key_width + value_width)
+    for L in range(1, max_length + 1):
+        out.write(ScrambleDictionary.POOL_ENTRY.pack(offset, len(pools[L])))
+        offset += L * len(pools[L])
+    for table in (forward, inverse):
+        for k, v in table:
+            out.write(k)
+            out.write(v)
+    for pool in pools:
+        for pseudo_word in pool:
+            out.write(pseudo_word.encode('utf-8'))
+    return out.getvalue()
+
+
+def load_dictionary(path):
+    '''Maps the dictionary saved in path (read-only)'''
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return ScrambleDictionary(data)
+
+
+def main():
+    op = OptionParser("Usage: %prog [options] file ...")
+    op.add_option('-o', '--output', help='File where the dictionary is saved.')
+    op.add_option('-s', '--seed', default=0, type=int,
+                  help='Seed for the generation of the pseudo-words.')
+    op.add_option('--pool-size', default=1000, type=int,
+                  help='Number of spare pseudo-words of each length.')
+    op.add_option('--max-length', default=16, type=int,
+                  help='Length of the longest spare pseudo-words.')
+    op.add_option('--unreadable', action='store_true', default=False,
+                  help='Do not alternate vowels and consonants.')
+    opt, args = op.parse_args()
+    if not opt.output:
+        op.error("Output file required.")
+    words = set()
+    for path in args:
+        with io.open(path, encoding='utf-8') as f:
+            words.update(w for w in re.split(r'\W+', f.read()) if w)
+    dictionary = generate_dictionary(words, opt.seed, not opt.unreadable,
+                                     opt.pool_size, opt.max_length)
+    dictionary.save(opt.output)
+
+
+if __name__ == '__main__':
+    main()
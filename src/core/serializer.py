@@ -15,6 +15,25 @@ import string
 import random
 import re
 import math
+import heapq
+from core.scramble_dictionary import VOWELS, CONSONANTS, draw_pseudo_word
+from core.symbol_frequencies import FREQUENCIES
+import core.trace as trace
+
+try:
+    unichr
+except NameError:  # Python 3
+    unichr = chr
+
+_tracer = trace.get_tracer('serializer')
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Must have numpy for bit arrays.")
+    return numpy
 
 
 class IdentitySerializer:
@@ -28,12 +47,51 @@ class IdentitySerializer:
     def to_binary(self, message):
         return message
 
+    def to_binary_symbols(self, message):
+        '''
+        Returns the encoding of each of the symbols of the message (their
+        concatenation is `to_binary(message)`).
+        '''
+        return list(message)
+
     def to_text(self, data):
         return data
 
     def can_deserialize(self, data):
         return data
 
+    def to_bits_array(self, message):
+        '''
+        Returns the message as a numpy array. Since this serializer sends
+        whole characters, the array holds one code point per symbol.
+        '''
+        np = _import_numpy()
+        return np.frombuffer(message.encode('utf-32-le'), dtype='<u4')
+
+    def from_bits_array(self, arr):
+        '''Inverse of `to_bits_array`'''
+        np = _import_numpy()
+        return np.asarray(arr, dtype='<u4').tobytes().decode('utf-32-le')
+
+    def incremental_decoder(self):
+        '''
+        Returns a stateful decoder that deserializes the input one symbol at a
+        time.
+        '''
+        return IdentityDecoder()
+
+
+class IdentityDecoder:
+    '''
+    Incremental counterpart of `IdentitySerializer.to_text`: every symbol is
+    a character on its own.
+    '''
+    def decode_bit(self, bit):
+        return bit
+
+    def reset(self):
+        pass
+
 
 class ScramblingSerializerWrapper:
     '''
@@ -50,42 +108,73 @@ class ScramblingSerializerWrapper:
     "vsdsf"), and now "apple" that was going through unchanged before, it's
     being mapped to a new string.
     '''
-    def __init__(self, serializer, readable=True):
+    # tokens that are not words
+    PUNCT = ",.:;'\"?"
+    TOKEN_SEPARATOR = re.compile(r'(\W)')
+    # maximum number of entries in the memoization caches
+    CACHE_SIZE = 10000
+
+    def __init__(self, serializer, readable=True, dictionary=None):
         '''
         Args:
             serialzer: underlying serializer that will get the calls forwarded.
+            dictionary: a `ScrambleDictionary` providing the pseudo-words (if
+            None, they are generated on the fly).
         '''
         # the underlying serializer
         self._serializer = serializer
         self.SILENCE_TOKEN = serializer.SILENCE_TOKEN
         # 'vowels' and 'consonants' (to be alternated if readable = true)
         self.readable = readable
-        self.V = 'aeiouy'
-        self.C = ''.join([i for i in string.ascii_lowercase if i not in self.V])
+        self.V = VOWELS
+        self.C = CONSONANTS
+        self.dictionary = dictionary
         # a mapping of real words to scrambled words an back
         self.word_mapping = {}
         self.inv_word_mapping = {}
+        # memoized results of `unscramble` and `capitalize`
+        self._unscramble_cache = {}
+        self._capitalize_cache = {}
         self.logger = logging.getLogger(__name__)
+        # only encode symbol by symbol if the real serializer can (the
+        # channels fall back to whole messages otherwise)
+        if hasattr(serializer, 'to_binary_symbols'):
+            self.to_binary_symbols = self._to_binary_symbols
 
     def to_binary(self, message):
-        self.logger.debug("Tokenizing message '{0}'".format(message))
+        # pass the scrambled message on to the real serializer
+        return self._serializer.to_binary(self.scramble_message(message))
+
+    def to_text(self, data):
+        # get the scrambled message back from the bits
+        return self.unscramble_message(self._serializer.to_text(data))
+
+    def _to_binary_symbols(self, message):
+        return self._serializer.to_binary_symbols(
+            self.scramble_message(message))
+
+    def to_bits_array(self, message):
+        return self._serializer.to_bits_array(self.scramble_message(message))
+
+    def from_bits_array(self, arr):
+        return self.unscramble_message(self._serializer.from_bits_array(arr))
+
+    def scramble_message(self, message):
         # get all the parts of the message without cutting the spaces out
         tokens = self.tokenize(message)
-        self.logger.debug("Scrambling message '{0}'".format(tokens))
         # transform each of the pieces (if needed) and merge them together
         scrambled_message = ''.join(self.scramble(t) for t in tokens)
-        self.logger.debug("Returning scrambled message '{0}'".format(
-            scrambled_message))
-        # pass it on to the real serializer
-        return self._serializer.to_binary(scrambled_message)
+        if _tracer.enabled:
+            _tracer.emit('scramble', message=message, tokens=tokens,
+                         scrambled_message=scrambled_message)
+        return scrambled_message
 
-    def to_text(self, data):
-        # get the scrambled message back from the bits
-        scrambled_message = self._serializer.to_text(data)
+    def unscramble_message(self, scrambled_message):
         # split into tokens, including spaces and punctuation marks
-        self.logger.debug("Tokenizing {0}".format(scrambled_message))
         tokens = self.tokenize(scrambled_message)
-        self.logger.debug("Unscrambling {0}".format(tokens))
+        if _tracer.enabled:
+            _tracer.emit('unscramble', scrambled_message=scrambled_message,
+                         tokens=tokens)
         # unmask the words in it
         return ''.join(self.unscramble(t) for t in tokens)
 
@@ -94,10 +183,22 @@ class ScramblingSerializerWrapper:
             return False
         # get the scrambled message back from the bits
         scrambled_message = self._serializer.to_text(data)
-        # split into tokens, including spaces and punctuation marks
-        tokens = self.tokenize(scrambled_message)
         # to deserialize we have to be at the end of a word.
-        return tokens and tokens[-1][1] != 'WORD'
+        return scrambled_message and self.ends_word(scrambled_message[-1])
+
+    def ends_word(self, char):
+        '''
+        Tells if the character is tokenized as something else than a word
+        (see `tokenize`), so that the text before it can be unscrambled.
+        '''
+        return char in self.PUNCT or char == self._serializer.SILENCE_TOKEN
+
+    def incremental_decoder(self):
+        '''
+        Returns a stateful decoder that deserializes the input one bit at a
+        time (see `ScramblingDecoder`).
+        '''
+        return ScramblingDecoder(self, self._serializer.incremental_decoder())
 
     def scramble(self, token):
         word, pos = token
@@ -108,12 +209,23 @@ class ScramblingSerializerWrapper:
             if word.lower() not in self.word_mapping:
                 # if we don't have a pseudo-word already assigned
                 # generate a new pseudo-word
-                pseudo_word = self.gen_pseudo_word(len(word))
+                pseudo_word = self.new_pseudo_word(word.lower())
                 self.word_mapping[word.lower()] = pseudo_word
                 self.inv_word_mapping[pseudo_word] = word.lower()
+                self._unscramble_cache.clear()
             return self.capitalize(word, self.word_mapping[word.lower()])
 
     def capitalize(self, word, scrambled_word):
+        key = (word, scrambled_word)
+        capitalized = self._capitalize_cache.get(key)
+        if capitalized is None:
+            if len(self._capitalize_cache) >= self.CACHE_SIZE:
+                self._capitalize_cache.clear()
+            capitalized = self._capitalize_cache[key] = \
+                self._capitalize(word, scrambled_word)
+        return capitalized
+
+    def _capitalize(self, word, scrambled_word):
         if len(scrambled_word) == len(word):
             # if the two words have the same length, we preverve capitalization
             return ''.join(scrambled_word[i].upper()
@@ -130,37 +242,48 @@ class ScramblingSerializerWrapper:
         if pos == 'SILENCE' or pos == 'PUNCT':
             # if this is a space or a punctuation sign, don't do anything
             return scrambled_word
+        word = self._unscramble_cache.get(scrambled_word)
+        if word is None:
+            if len(self._unscramble_cache) >= self.CACHE_SIZE:
+                self._unscramble_cache.clear()
+            word = self._unscramble_cache[scrambled_word] = \
+                self._unscramble_word(scrambled_word)
+        return word
+
+    def _unscramble_word(self, scrambled_word):
+        # say that we have apple -> qwerty
+        # if the word is qwerty, we return apple
+        if scrambled_word.lower() in self.inv_word_mapping:
+            return self.capitalize(scrambled_word,
+                                   self.inv_word_mapping[
+                                       scrambled_word.lower()])
+        # conversely, if the word is apple, we return qwerty
+        # so we have a bijection between the scrambled and normal words
+        elif scrambled_word.lower() in self.word_mapping:
+            return self.capitalize(scrambled_word, self.word_mapping[
+                scrambled_word.lower()])
         else:
-            # say that we have apple -> qwerty
-            # if the word is qwerty, we return apple
-            if scrambled_word.lower() in self.inv_word_mapping:
-                return self.capitalize(scrambled_word,
-                                       self.inv_word_mapping[
-                                           scrambled_word.lower()])
-            # conversely, if the word is apple, we return qwerty
-            # so we have a bijection between the scrambled and normal words
-            elif scrambled_word.lower() in self.word_mapping:
-                return self.capitalize(scrambled_word, self.word_mapping[
-                    scrambled_word.lower()])
-            else:
-                # otherwise we just return the word as is
-                return scrambled_word
+            # otherwise we just return the word as is
+            return scrambled_word
+
+    def new_pseudo_word(self, word):
+        '''Picks the pseudo-word for a word that has not been mapped yet'''
+        if self.dictionary is not None:
+            # the dictionary assigns the same pseudo-words in every process
+            pseudo_word = self.dictionary.get_pseudo_word(word)
+            if pseudo_word is None or pseudo_word in self.inv_word_mapping:
+                pseudo_word = self.dictionary.draw_pseudo_word(
+                    len(word), self.inv_word_mapping)
+            if pseudo_word is not None:
+                return pseudo_word
+        return self.gen_pseudo_word(len(word))
 
     def gen_pseudo_word(self, L=None):
         if not L:
             L = random.randint(1, 8)
         # generate one word that we hadn't used before
         while True:
-            if self.readable:
-                # alternating between vowels and consonants, sampled with repl.
-                _choice, _range = random.choice, range(int(math.ceil(L / 2)))
-                v = [_choice(self.V) for i in _range]
-                c = [_choice(self.C) for i in _range]
-                zipped = zip(v, c) if random.getrandbits(1) else zip(c, v)
-                pseudo_word = ''.join([a for b in zipped for a in b])[:L]
-            else:
-                pseudo_word = ''.join(random.sample(
-                                      string.ascii_lowercase, L))
+            pseudo_word = draw_pseudo_word(random, L, self.readable)
             if pseudo_word not in self.inv_word_mapping:
                 return pseudo_word
 
@@ -168,10 +291,10 @@ class ScramblingSerializerWrapper:
         '''
         Simplified tokenizer that splits a message over spaces and punctuation.
         '''
-        punct = ",.:;'\"?"
+        punct = self.PUNCT
         silence_token = self._serializer.SILENCE_TOKEN
         tokenized_message = []
-        tokens = re.split('(\W)', message)
+        tokens = self.TOKEN_SEPARATOR.split(message)
         for t in tokens:
             if not t:
                 # re.split can return empty strings between consecutive
@@ -187,6 +310,35 @@ class ScramblingSerializerWrapper:
         return tokenized_message
 
 
+class ScramblingDecoder:
+    '''
+    Incremental counterpart of `ScramblingSerializerWrapper.to_text`.
+
+    The characters decoded by the underlying serializer are held back until
+    one of them ends a word; then the text received since the last output is
+    unscrambled and returned at once. Every character is only examined once.
+    '''
+    def __init__(self, scrambler, decoder):
+        self._scrambler = scrambler
+        self._decoder = decoder
+        self._pending = []
+
+    def reset(self):
+        self._decoder.reset()
+        self._pending = []
+
+    def decode_bit(self, bit):
+        char = self._decoder.decode_bit(bit)
+        if char is None:
+            return None
+        self._pending.append(char)
+        if not self._scrambler.ends_word(char):
+            return None
+        scrambled_message = ''.join(self._pending)
+        self._pending = []
+        return self._scrambler.unscramble_message(scrambled_message)
+
+
 class StandardSerializer:
     '''
     Transforms text into bits and back using UTF-8 format.
@@ -194,6 +346,17 @@ class StandardSerializer:
     def __init__(self):
         self.SILENCE_TOKEN = ' '
         self.SILENCE_ENCODING = u' '
+        # codec tables mapping every byte value to its bits and back
+        self._byte_to_bits = [format(i, '08b') for i in range(256)]
+        self._bits_to_byte = dict((bits, i) for i, bits in
+                                  enumerate(self._byte_to_bits))
+        # single ASCII characters (the bulk of the traffic) decode directly
+        self._bits_to_ascii = dict(
+            (bits, bytes(bytearray([i])).decode('utf-8').replace(
+                self.SILENCE_ENCODING, self.SILENCE_TOKEN))
+            for i, bits in enumerate(self._byte_to_bits[:128]))
+        # encoding of every character seen so far
+        self._char_to_bits = {}
         self.logger = logging.getLogger(__name__)
 
     def to_binary(self, message):
@@ -204,23 +367,24 @@ class StandardSerializer:
         # All spaces are encoded as null bytes:
         message = message.replace(self.SILENCE_TOKEN, self.SILENCE_ENCODING)
         # handle unicode
-        message = codecs.encode(message, 'utf-8')
-        data = []
+        message = bytearray(message.encode('utf-8'))
+        # look up the binary representation of each byte
+        byte_to_bits = self._byte_to_bits
+        return ''.join([byte_to_bits[c] for c in message])
+
+    def to_binary_symbols(self, message):
+        '''
+        Returns the encoding of each of the characters of the message (their
+        concatenation is `to_binary(message)`).
+        '''
+        char_to_bits = self._char_to_bits
+        symbols = []
         for c in message:
-            # get the numeric value of the character
-            try:
-                c = ord(c)
-            except TypeError:
-                # already an int (Python 3)
-                pass
-            # convert to binary
-            bin_c = bin(c)
-            # remove the '0b' prefix
-            bin_c = bin_c[2:]
-            # pad with zeros
-            bin_c = bin_c.zfill(8)
-            data.append(bin_c)
-        return ''.join(data)
+            bits = char_to_bits.get(c)
+            if bits is None:
+                bits = char_to_bits[c] = self.to_binary(c)
+            symbols.append(bits)
+        return symbols
 
     def to_text(self, data, strict=False):
         '''Transforms a binary string into text.
@@ -237,25 +401,55 @@ class StandardSerializer:
 
         Returns: A string with containing the decoded text.
         '''
+        message = self._bits_to_ascii.get(data)
+        if message is not None:
+            return message
+        # convert data to a byte-stream (skipping whole bytes keeps the
+        # alignment, so this is only done once)
+        n_bytes = int(len(data) / 8)
+        bits_to_byte = self._bits_to_byte
+        byte_stream = bytes(bytearray([bits_to_byte[data[i:i + 8]]
+                                       for i in range(0, n_bytes * 8, 8)]))
+        return self._decode_bytes(byte_stream, strict)
+
+    def to_bits_array(self, message):
+        '''
+        Vectorized `to_binary`: returns the bits of the message as a numpy
+        array of uint8 (one 0/1 value per bit).
+        '''
+        np = _import_numpy()
+        message = message.replace(self.SILENCE_TOKEN, self.SILENCE_ENCODING)
+        return np.unpackbits(np.frombuffer(message.encode('utf-8'),
+                                           dtype=np.uint8))
+
+    def from_bits_array(self, arr, strict=False):
+        '''
+        Vectorized `to_text`: decodes an array of 0/1 values. As in
+        `to_text`, trailing bits that do not fill a byte are ignored.
+        '''
+        np = _import_numpy()
+        arr = np.asarray(arr, dtype=np.uint8)
+        n_bits = len(arr) - len(arr) % 8
+        return self._decode_bytes(np.packbits(arr[:n_bits]).tobytes(), strict)
+
+    def _decode_bytes(self, byte_stream, strict):
         # if we are not in strict mode, we can skip bytes to find a message
-        for skip in range(int(len(data) / 8) if not strict else 1):
+        skip = 0
+        while skip < (len(byte_stream) if not strict else 1):
             try:
-                # convert data to a byte-stream
-                message = bytearray()
-                sub_data = data[skip * 8:]
-                for i in range(int(len(sub_data) / 8)):
-                    b = sub_data[i * 8:(i + 1) * 8]
-                    message.append(int(b, 2))
-                message = codecs.decode(message, 'utf-8')
-                message = message.replace(self.SILENCE_ENCODING,
-                                          self.SILENCE_TOKEN)
-                if skip > 0:
-                    self.logger.debug("Skipping {0} bytes to find a valid "
-                                     "unicode character".format(skip))
-
-                return message
-            except UnicodeDecodeError:
-                pass
+                message = byte_stream[skip:].decode('utf-8')
+            except UnicodeDecodeError as e:
+                # UTF-8 is self-synchronizing: starting anywhere before the
+                # invalid sequence would fail on it again, so we resume
+                # right after its first byte.
+                skip += e.start + 1
+                continue
+            message = message.replace(self.SILENCE_ENCODING,
+                                      self.SILENCE_TOKEN)
+            if skip > 0 and _tracer.enabled:
+                # bytes skipped to find a valid unicode character
+                _tracer.emit('skip_bytes', skip=skip)
+            return message
 
         return None
 
@@ -264,31 +458,117 @@ class StandardSerializer:
             return False
         return self.to_text(data) is not None
 
+    def incremental_decoder(self):
+        '''
+        Returns a stateful decoder that deserializes the input one bit at a
+        time (see `UTF8BitDecoder`).
+        '''
+        return UTF8BitDecoder(self)
+
+
+class UTF8BitDecoder:
+    '''
+    Incremental counterpart of `StandardSerializer.to_text`.
+
+    It is fed one bit at a time and returns a character as soon as the bytes
+    received so far end with a complete UTF-8 code point, or None otherwise.
+    As the non-strict `to_text`, it skips the bytes that cannot be decoded:
+    the lead byte of every sequence tells how many continuation bytes follow
+    it, so it resynchronizes on the next lead byte in O(1).
+    '''
+    BIT_VALUES = {'0': 0, '1': 1, 0: 0, 1: 1}
+    # number of bytes in the sequence started by each byte value (0 for
+    # continuation bytes and for bytes that never appear in UTF-8)
+    SEQUENCE_LENGTH = tuple(1 if b < 0x80 else
+                            0 if b < 0xC2 else
+                            2 if b < 0xE0 else
+                            3 if b < 0xF0 else
+                            4 if b < 0xF5 else
+                            0 for b in range(256))
+
+    def __init__(self, serializer):
+        self._serializer = serializer
+        self.reset()
+
+    def reset(self):
+        # value of the byte that is being received and its number of bits
+        self._byte = 0
+        self._nbits = 0
+        # bytes of the sequence that is being received and its length
+        self._pending = bytearray()
+        self._sequence_length = 0
+
+    def decode_bit(self, bit):
+        self._byte = (self._byte << 1) | self.BIT_VALUES[bit]
+        self._nbits += 1
+        if self._nbits < 8:
+            return None
+        byte = self._byte
+        self._byte = 0
+        self._nbits = 0
+        if 0x80 <= byte < 0xC0:
+            # a continuation byte: it only counts within a sequence
+            if not self._pending:
+                return None
+            self._pending.append(byte)
+            if len(self._pending) < self._sequence_length:
+                return None
+        else:
+            # any other byte starts a new sequence (dropping an unfinished
+            # one)
+            self._sequence_length = self.SEQUENCE_LENGTH[byte]
+            if self._sequence_length == 0:
+                self._pending = bytearray()
+                return None
+            self._pending = bytearray([byte])
+            if self._sequence_length > 1:
+                return None
+        pending, self._pending = self._pending, bytearray()
+        try:
+            char = codecs.decode(bytes(pending), 'utf-8')
+        except UnicodeDecodeError:
+            # e.g. surrogates or code points that are out of range
+            return None
+        return char.replace(self._serializer.SILENCE_ENCODING,
+                            self._serializer.SILENCE_TOKEN)
+
 
 class GeneralSerializer:
     '''
     Transforms text into bits and back using specified mapping.
-    Expects an index to symbol mapping `i2s`.
+    Expects an index to symbol mapping `i2s` (either a dict or a sequence of
+    symbols). Every symbol is encoded with the same number of bits, the
+    smallest that can represent all the indices; the unused codes decode as
+    silence.
     silence_idx is which index in mapping is silence, defaults to 0
     '''
-    def __init__(self, i2s, silence_idx):
+    def __init__(self, i2s, silence_idx=None):
         self.SILENCE_TOKEN = ' '
         self.SILENCE_ENCODING = silence_idx if silence_idx is not None else 0
 
-        self.i2s = i2s
-        self.s2i = {}
-        for k, v in self.i2s.items:
-            self.s2i[v] = k
-
-        self.L = math.ceil(math.log(len(self.i2s), 2))
+        if not isinstance(i2s, dict):
+            i2s = dict(enumerate(i2s))
+        # the codes are the indices, so they must fit the largest one
+        self.L = max(1, int(math.ceil(math.log(max(i2s) + 1, 2))))
 
         # pad end of dictionary with silence
-        for k in range(len(self.i2s), math.pow(2, self.L)):
-            self.i2s[k] = self.SILENCE_TOKEN
+        self.i2s = [i2s.get(k, self.SILENCE_TOKEN)
+                    for k in range(2 ** self.L)]
+        self.s2i = {}
+        for k, v in i2s.items():
+            self.s2i[v] = k
 
-        assert i2s[self.SILENCE_ENCODING] == self.SILENCE_TOKEN, \
+        assert self.i2s[self.SILENCE_ENCODING] == self.SILENCE_TOKEN, \
                                                 'mapping conflict for silence'
 
+        # codec tables from symbols to their codes and back
+        fmt = '0{0}b'.format(self.L)
+        self._s2bits = dict((s, format(k, fmt)) for s, k in self.s2i.items())
+        self._bits2s = dict((format(k, fmt), v) for k, v in
+                            enumerate(self.i2s))
+        # numpy versions of the tables, built on first use
+        self._np_tables = None
+
         self.logger = logging.getLogger(__name__)
 
     def to_binary(self, message):
@@ -296,49 +576,291 @@ class GeneralSerializer:
         Given a text message, returns a binary string (still represented as a
         character string).
         '''
-        message = codecs.encode(message, 'ascii')
-
-        data = []
-        for c in message:
-            c = self.s2i[c]
-            bin_c = bin(c)[2:]
-            bin_c = bin_c.zfill(self.L)
-            data.append(bin_c)
+        return ''.join(self.to_binary_symbols(message))
 
-        return ''.join(data)
+    def to_binary_symbols(self, message):
+        '''
+        Returns the encoding of each of the symbols of the message (their
+        concatenation is `to_binary(message)`).
+        '''
+        s2bits = self._s2bits
+        return [s2bits[c] for c in message]
 
     def to_text(self, data):
         '''Transforms a binary string into text.
 
-        Given a binary string, returns the encoded text. If the
-        string cannot be deserialized, returns None.
+        Given a binary string, returns the encoded text. Trailing bits that
+        do not make a whole symbol are ignored.
 
         Args:
             data: the binary string to deserialze.
 
         Returns: A string with containing the decoded text.
         '''
-        buff = codecs.encode(data, 'ascii')
-        text = u''
-        while buff != "":
-            idx = int(buff[:self.L], 2)
-            text = text + self.i2s[idx]
-            buff = buff[self.L:]
-        return text
+        bits2s, L = self._bits2s, self.L
+        return ''.join([bits2s[data[i:i + L]]
+                        for i in range(0, len(data) - L + 1, L)])
 
     def can_deserialize(self, data):
         if len(data) < self.L:
             return False
         return self.to_text(data) is not None
 
+    def to_bits_array(self, message):
+        '''
+        Vectorized `to_binary`: returns the bits of the message as a numpy
+        array of uint8 (one 0/1 value per bit).
+        '''
+        np = _import_numpy()
+        code_to_idx, symbols, shifts = self._get_np_tables()
+        codes = np.frombuffer(message.encode('utf-32-le'), dtype='<u4')
+        idx = code_to_idx[np.minimum(codes, len(code_to_idx) - 1)]
+        unknown = np.flatnonzero(idx < 0)
+        if len(unknown) > 0:
+            raise KeyError(message[unknown[0]])
+        return ((idx[:, None] >> shifts) & 1).astype(np.uint8).ravel()
+
+    def from_bits_array(self, arr):
+        '''Vectorized `to_text`: decodes an array of 0/1 values.'''
+        np = _import_numpy()
+        code_to_idx, symbols, shifts = self._get_np_tables()
+        arr = np.asarray(arr, dtype=np.int64)
+        n = len(arr) // self.L
+        idx = arr[:n * self.L].reshape(n, self.L).dot(1 << shifts)
+        return ''.join(symbols[idx].tolist())
+
+    def _get_np_tables(self):
+        if self._np_tables is None:
+            np = _import_numpy()
+            # code point -> symbol index (-1 for symbols out of the mapping,
+            # the last entry catches every code point beyond the table)
+            code_to_idx = np.full(max(ord(s) for s in self.s2i) + 2, -1,
+                                  dtype=np.int64)
+            for s, k in self.s2i.items():
+                code_to_idx[ord(s)] = k
+            self._np_tables = (code_to_idx, np.array(self.i2s),
+                               np.arange(self.L - 1, -1, -1))
+        return self._np_tables
+
+    def incremental_decoder(self):
+        '''
+        Returns a stateful decoder that deserializes the input one bit at a
+        time (see `FixedWidthDecoder`).
+        '''
+        return FixedWidthDecoder(self)
+
+
+class FixedWidthDecoder:
+    '''
+    Incremental counterpart of `GeneralSerializer.to_text`: emits a symbol
+    every `L` bits.
+    '''
+    BIT_VALUES = {'0': 0, '1': 1, 0: 0, 1: 1}
+
+    def __init__(self, serializer):
+        self._i2s = serializer.i2s
+        self._width = serializer.L
+        self.reset()
+
+    def reset(self):
+        self._idx = 0
+        self._nbits = 0
+
+    def decode_bit(self, bit):
+        self._idx = (self._idx << 1) | self.BIT_VALUES[bit]
+        self._nbits += 1
+        if self._nbits < self._width:
+            return None
+        symbol = self._i2s[self._idx]
+        self.reset()
+        return symbol
 
-class ASCIISerializer:
+
+class ASCIISerializer(GeneralSerializer):
     '''
     Transforms text into bits and back according to ASCII format.
     '''
     def __init__(self):
         i2s = {}
-        for k in range(0, 255):
-            i2s[k] = chr(k)
+        for k in range(0, 128):
+            i2s[k] = '{0:c}'.format(k)
+
+        GeneralSerializer.__init__(self, i2s, ord(' '))
+
+
+class HuffmanSerializer:
+    '''
+    Transforms text into bits and back with a prefix code (a canonical
+    Huffman code) built from the frequencies of the symbols, so the frequent
+    ones take less bits. By default, the frequencies are those of the
+    messages sent by the competition tasks (see `core.symbol_frequencies`).
+
+    The symbols out of the frequency table are sent as an escape code
+    followed by their code point in 21 bits. Since the code is complete, any
+    bit string decodes into some text (the escaped code points that are not
+    valid characters are dropped).
+    '''
+    CODE_POINT_BITS = 21
+    # the escape code stands for an out-of-table symbol
+    ESCAPE = None
 
-        return GeneralSerializer(i2s, ord(' '))
+    def __init__(self, frequencies=None):
+        self.SILENCE_TOKEN = ' '
+        frequencies = dict(frequencies if frequencies is not None
+                           else FREQUENCIES)
+        # silence must always be cheap to send and escaping always possible
+        frequencies.setdefault(self.SILENCE_TOKEN, 1)
+        frequencies[self.ESCAPE] = 1
+        self._s2bits = self._build_code(frequencies)
+        self._fmt_code_point = '0{0}b'.format(self.CODE_POINT_BITS)
+        # decoding trie: node 0 is the root and each node holds its two
+        # children, either another node (a positive index) or a leaf (~ the
+        # index of its symbol)
+        self._symbols = []
+        self._trie = [[None, None]]
+        for symbol, bits in self._s2bits.items():
+            node = 0
+            for bit in bits[:-1]:
+                child = self._trie[node][bit == '1']
+                if child is None:
+                    child = self._trie[node][bit == '1'] = len(self._trie)
+                    self._trie.append([None, None])
+                node = child
+            self._trie[node][bits[-1] == '1'] = ~len(self._symbols)
+            self._symbols.append(symbol)
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def _build_code(frequencies):
+        '''Returns the canonical Huffman code of every symbol'''
+        # the ties are broken by the symbol, so the code does not depend on
+        # the order of the table
+        def order(symbol):
+            return '' if symbol is None else ' ' + symbol
+        heap = [(count, order(symbol), [symbol])
+                for symbol, count in frequencies.items()]
+        heapq.heapify(heap)
+        lengths = dict((symbol, 0) for symbol in frequencies)
+        while len(heap) > 1:
+            count1, key1, symbols1 = heapq.heappop(heap)
+            count2, key2, symbols2 = heapq.heappop(heap)
+            for symbol in symbols1 + symbols2:
+                lengths[symbol] += 1
+            heapq.heappush(heap, (count1 + count2, min(key1, key2),
+                                  symbols1 + symbols2))
+        # canonical code: consecutive codes by increasing length
+        code, previous_length = 0, 0
+        s2bits = {}
+        for symbol in sorted(lengths, key=lambda s: (lengths[s], order(s))):
+            length = max(1, lengths[symbol])
+            code <<= length - previous_length
+            s2bits[symbol] = format(code, '0{0}b'.format(length))
+            code += 1
+            previous_length = length
+        return s2bits
+
+    def to_binary(self, message):
+        '''
+        Given a text message, returns a binary string (still represented as a
+        character string).
+        '''
+        return ''.join(self.to_binary_symbols(message))
+
+    def to_binary_symbols(self, message):
+        '''
+        Returns the encoding of each of the symbols of the message (their
+        concatenation is `to_binary(message)`).
+        '''
+        s2bits = self._s2bits
+        return [s2bits.get(c) or self._escape(c) for c in message]
+
+    def _escape(self, c):
+        return self._s2bits[self.ESCAPE] + format(ord(c), self._fmt_code_point)
+
+    def to_text(self, data):
+        '''Transforms a binary string into text.
+
+        Given a binary string, returns the encoded text. Trailing bits that
+        do not make a whole symbol are ignored.
+
+        Args:
+            data: the binary string to deserialze.
+
+        Returns: A string with containing the decoded text.
+        '''
+        trie, symbols = self._trie, self._symbols
+        text = []
+        node = 0
+        i, n = 0, len(data)
+        while i < n:
+            node = trie[node][data[i] == '1']
+            i += 1
+            if node < 0:
+                symbol = symbols[~node]
+                node = 0
+                if symbol is self.ESCAPE:
+                    if i + self.CODE_POINT_BITS > n:
+                        break
+                    symbol = self._unescape(
+                        int(data[i:i + self.CODE_POINT_BITS], 2))
+                    i += self.CODE_POINT_BITS
+                text.append(symbol)
+        return ''.join(text)
+
+    @staticmethod
+    def _unescape(code_point):
+        if code_point > 0x10FFFF or 0xD800 <= code_point < 0xE000:
+            return ''
+        return unichr(code_point)
+
+    def can_deserialize(self, data):
+        return self.to_text(data) != ''
+
+    def incremental_decoder(self):
+        '''
+        Returns a stateful decoder that deserializes the input one bit at a
+        time (see `HuffmanDecoder`).
+        '''
+        return HuffmanDecoder(self)
+
+
+class HuffmanDecoder:
+    '''
+    Incremental counterpart of `HuffmanSerializer.to_text`: walks down the
+    decoding trie one bit at a time.
+    '''
+    BIT_VALUES = {'0': 0, '1': 1, 0: 0, 1: 1}
+
+    def __init__(self, serializer):
+        self._serializer = serializer
+        self._trie = serializer._trie
+        self._symbols = serializer._symbols
+        self.reset()
+
+    def reset(self):
+        self._node = 0
+        # bits of an escaped code point (None outside of an escape)
+        self._code_point = None
+        self._nbits = 0
+
+    def decode_bit(self, bit):
+        bit = self.BIT_VALUES[bit]
+        if self._code_point is not None:
+            self._code_point = (self._code_point << 1) | bit
+            self._nbits += 1
+            if self._nbits < self._serializer.CODE_POINT_BITS:
+                return None
+            symbol = self._serializer._unescape(self._code_point)
+            self.reset()
+            return symbol or None
+        node = self._trie[self._node][bit]
+        if node >= 0:
+            self._node = node
+            return None
+        self._node = 0
+        symbol = self._symbols[~node]
+        if symbol is HuffmanSerializer.ESCAPE:
+            self._code_point = 0
+            self._nbits = 0
+            return None
+        return symbol
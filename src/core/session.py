@@ -21,6 +21,11 @@ class Session:
         self._learner = learner
         self._default_sleep = default_sleep
         self._sleep = self._default_sleep
+        # let the learner look at the channels of the environment
+        set_channel_views = getattr(learner, 'set_channel_views', None)
+        if set_channel_views is not None:
+            set_channel_views(environment.get_output_view(),
+                              environment.get_input_view())
         # listen to changes in the currently running task
         self._env.task_updated.register(self.on_task_updated)
         # observable status
@@ -48,7 +53,9 @@ class Session:
         self._stop = False
 
         while not self._stop:
-            # first speaks the environment one token (one bit)
+            # first speaks the environment one token (one bit, one
+            # character in symbol granularity or one k-bit int in word
+            # granularity)
             token, reward = self._env.next(token, test_mode=self._learner.test_mode)
             self.env_token_updated(token)
             # reward the learner if it has been set
@@ -0,0 +1,172 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree. An additional grant
+# of patent rights can be found in the PATENTS file in the same directory.
+
+'''
+Frequencies of the symbols that the teacher sends, used to build the prefix
+code of the `HuffmanSerializer`.
+
+The table below was gathered from the messages of the competition tasks
+with a silent learner. To gather it again (it takes Python 2, as some of the
+tasks do)::
+
+    python -m core.symbol_frequencies [-n STEPS] [tasks_config.json ...]
+'''
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from optparse import OptionParser
+from collections import Counter
+import logging
+import random
+import string
+
+FREQUENCIES = {
+    ' ': 2992,
+    '!': 116,
+    '"': 13,
+    '#': 1,
+    '$': 1,
+    '%': 1,
+    '&': 1,
+    "'": 104,
+    '(': 8,
+    ')': 8,
+    '*': 1,
+    '+': 1,
+    ',': 122,
+    '-': 1,
+    '.': 437,
+    '/': 1,
+    '0': 1,
+    '1': 1,
+    '2': 16,
+    '3': 10,
+    '4': 1,
+    '5': 3,
+    '6': 3,
+    '7': 2,
+    '8': 3,
+    '9': 1,
+    ':': 123,
+    ';': 1,
+    '<': 1,
+    '=': 1,
+    '>': 1,
+    '?': 115,
+    '@': 1,
+    'A': 1,
+    'B': 1,
+    'C': 2,
+    'D': 15,
+    'E': 1,
+    'F': 1,
+    'G': 8,
+    'H': 20,
+    'I': 68,
+    'J': 1,
+    'K': 1,
+    'L': 27,
+    'M': 13,
+    'N': 1,
+    'O': 3,
+    'P': 20,
+    'Q': 1,
+    'R': 1,
+    'S': 7,
+    'T': 32,
+    'U': 1,
+    'V': 1,
+    'W': 15,
+    'X': 2,
+    'Y': 26,
+    'Z': 1,
+    '[': 1,
+    '\\': 1,
+    ']': 1,
+    '^': 1,
+    '_': 1,
+    '`': 1,
+    'a': 1528,
+    'b': 305,
+    'c': 423,
+    'd': 305,
+    'e': 1514,
+    'f': 102,
+    'g': 272,
+    'h': 609,
+    'i': 787,
+    'j': 82,
+    'k': 133,
+    'l': 427,
+    'm': 333,
+    'n': 876,
+    'o': 1388,
+    'p': 498,
+    'q': 2,
+    'r': 1036,
+    's': 885,
+    't': 1132,
+    'u': 358,
+    'v': 162,
+    'w': 360,
+    'x': 20,
+    'y': 377,
+    'z': 8,
+    '{': 1,
+    '|': 1,
+    '}': 1,
+    '~': 1,
+}
+
+
+def gather_frequencies(tasks_config_file, steps):
+    '''
+    Runs a silent learner on all the tasks of the configuration for some
+    steps and counts the characters of the messages that the tasks send (the
+    silence that fills the gaps between them is left out).
+    '''
+    # imported here: gathering needs the whole task machinery
+    from core.environment import Environment
+    from core.serializer import IdentitySerializer
+    from learners.sample_learners import SampleSilentLearner
+    from benchmarks.common import create_scheduler, run_learner
+    counts = Counter()
+
+    class CountingSerializer(IdentitySerializer):
+        def to_binary_symbols(self, message):
+            if message != self.SILENCE_TOKEN:
+                counts.update(message)
+            return IdentitySerializer.to_binary_symbols(self, message)
+
+    env = Environment(CountingSerializer(),
+                      create_scheduler(tasks_config_file), max_history=100)
+    run_learner(env, SampleSilentLearner(), steps)
+    return counts
+
+
+def main():
+    op = OptionParser("Usage: %prog [options] [tasks_config.json ...]")
+    op.add_option('-n', '--steps', default=100000, type=int,
+                  help='Number of environment steps for each configuration.')
+    opt, args = op.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    random.seed(0)
+    # every printable ASCII character gets a code of its own, even if the
+    # tasks never send it
+    counts = Counter(c for c in string.printable if c not in '\t\n\r\x0b\x0c')
+    for tasks_config_file in args or [str('tasks_config.sample.json')]:
+        counts.update(gather_frequencies(tasks_config_file, opt.steps))
+    print('FREQUENCIES = {')
+    for symbol, count in sorted(counts.items()):
+        print('    {0!r}: {1},'.format(str(symbol), count))
+    print('}')
+
+
+if __name__ == '__main__':
+    main()
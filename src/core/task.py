@@ -10,7 +10,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 from core.obs.observer import Observable
-from core.events import Trigger
+from core.events import Trigger, PatternCondition
 from collections import defaultdict, namedtuple
 import logging
 import re
@@ -21,9 +21,35 @@ Ended = namedtuple('Ended', ())
 WorldStart = namedtuple('WorldStart', ())
 Timeout = namedtuple('Timeout', ())
 
-SequenceReceived = namedtuple('SequenceReceived', ('sequence',))
-OutputSequenceUpdated = namedtuple('OutputSequenceUpdated',
-                                   ('output_sequence',))
+
+class LazySequenceEvent(object):
+    '''
+    Base for the events carrying a sequence of bits. The sequence can be given
+    either directly or as a function that renders it, so it is only built if
+    some handler looks at it.
+    '''
+    def __init__(self, sequence=None, render=None):
+        self._sequence = sequence
+        self._render = render
+
+    def _get_sequence(self):
+        if self._sequence is None:
+            self._sequence = self._render()
+        return self._sequence
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(self.__class__.__name__,
+                                   self._get_sequence())
+
+
+class SequenceReceived(LazySequenceEvent):
+    sequence = property(LazySequenceEvent._get_sequence)
+
+
+class OutputSequenceUpdated(LazySequenceEvent):
+    output_sequence = property(LazySequenceEvent._get_sequence)
+
+
 OutputMessageUpdated = namedtuple('OutputMessageUpdated',
                                    ('output_message',))
 
@@ -41,11 +67,12 @@ class StateChanged(namedtuple('StateChanged', ('state', 'second_state'))):
 # helper methods for handling received messages
 class MessageReceived():
     '''A message received event. It has some useful helpers'''
+    # this gets assigned the outcome of the trigger's condition (declaring it
+    # in the class tells the event manager to do so)
+    condition_outcome = None
+
     def __init__(self, message):
         self.message = message
-        # this instance variable gets assigned the outcome of the
-        # trigger's condition
-        self.condition_outcome = None
 
     def is_message(self, msg, suffix=''):
         '''Checks if the received message matches the one in the parameter'''
@@ -79,11 +106,28 @@ class MessageReceived():
 # Event handlers are annotated through decorators and are automatically
 # registered by the environment on Task startup
 
-# Implementation trick to remember the type of event and the filtering condition
-# that is informed through the decorators.
-# We map the annotated methods to their corresponding triggers, so when we start
-# a task, we can scan through its memebers and find the trigger here.
-global_event_handlers = {}
+# The decorators remember the type of event and the filtering condition in a
+# trigger that is stored as an attribute of the handler function. The triggers
+# of the methods of a class are collected when the class is created (see
+# `TriggerCollector`).
+TRIGGER_ATTRIBUTE = '_event_trigger'
+
+
+def set_trigger(f, event_type, condition):
+    '''
+    Attaches to the handler f a trigger for the given type of event and
+    filtering condition. Returns the handler function itself.
+
+    If f is a bound method (a handler added at runtime with
+    `ScriptSet.add_handler`), its function is shared by all the instances of
+    the class, so the trigger is returned instead of being attached to it.
+    '''
+    func = method_to_func(f)
+    trigger = Trigger(event_type, condition, func)
+    if func is not f:
+        return trigger
+    setattr(f, TRIGGER_ATTRIBUTE, trigger)
+    return f
 
 
 def method_to_func(f):
@@ -105,10 +149,8 @@ def on_start():
     Start event decorator
     """
     def register(f):
-        f = method_to_func(f)
         # The filtering condition is always True
-        global_event_handlers[f] = Trigger(Start, lambda e: True, f)
-        return f
+        return set_trigger(f, Start, lambda e: True)
     return register
 
 
@@ -116,10 +158,8 @@ def on_start():
 def on_ended():
     """Denitialization event decorator"""
     def register(f):
-        f = method_to_func(f)
         # The filtering condition is always True
-        global_event_handlers[f] = Trigger(Ended, lambda e: True, f)
-        return f
+        return set_trigger(f, Ended, lambda e: True)
     return register
 
 
@@ -129,10 +169,8 @@ def on_world_start():
     WorldStart event decorator
     """
     def register(f):
-        f = method_to_func(f)
         # The filtering condition is always True
-        global_event_handlers[f] = Trigger(WorldStart, lambda e: True, f)
-        return f
+        return set_trigger(f, WorldStart, lambda e: True)
     return register
 
 
@@ -143,19 +181,15 @@ def on_state_changed(condition):
     that takes the tasks state (or the world state and the task state, in that
     order, if the task has a world parameter) and checks for any condition
     on those state variables. Notice that the argument is the `state` instance
-    variable within the task and not the task itself.
+    variable within the task and not the task itself. The condition should
+    only depend on the state variables: its outcome is reused until the
+    variables that it read change.
     '''
     def register(f):
-        f = method_to_func(f)
-        # The filtering condition is given as an argument.
-        # There could be one or two state objects (corresponding to the
-        # world state). So we check if we need to call the condition with
-        # one or two arguments.
-        global_event_handlers[f] = Trigger(
-            StateChanged, lambda e: e.second_state and
-            condition(e.state, e.second_state) or
-            (not e.second_state and condition(e.state)), f)
-        return f
+        # The filtering condition is given as an argument (it is only
+        # evaluated again when the state variables that it reads change, see
+        # `StateCondition`)
+        return set_trigger(f, StateChanged, StateCondition(condition))
     return register
 
 
@@ -165,18 +199,13 @@ def on_message(target_message=None):
     optionally receives a regular expression to be matched against the message.
     """
     def register(f):
-        f = method_to_func(f)
         # If a target message is given, interpret it as a regular expression
+        # (the filtering condition searches it in the event message)
         if target_message:
-            cmessage = re.compile(target_message)
+            condition = PatternCondition(target_message, 'message')
         else:
-            cmessage = None
-        # The filtering condition applied the target message expression
-        # to the event message
-        global_event_handlers[f] = Trigger(
-            MessageReceived,
-            lambda e: cmessage is None or cmessage.search(e.message), f)
-        return f
+            condition = lambda e: True
+        return set_trigger(f, MessageReceived, condition)
     return register
 
 
@@ -186,18 +215,13 @@ def on_output_message(target_message=None):
     Environment.
     """
     def register(f):
-        f = method_to_func(f)
         # If a target message is given, interpret it as a regular expression
+        # (the filtering condition searches it in the event message)
         if target_message:
-            cmessage = re.compile(target_message)
+            condition = PatternCondition(target_message, 'output_message')
         else:
-            cmessage = None
-        # The filtering condition applied the target message expression
-        # to the event message
-        global_event_handlers[f] = Trigger(
-            OutputMessageUpdated,
-            lambda e: cmessage is None or cmessage.search(e.output_message), f)
-        return f
+            condition = lambda e: True
+        return set_trigger(f, OutputMessageUpdated, condition)
     return register
 
 
@@ -206,16 +230,12 @@ def on_sequence(target_sequence=None):
     Decorator to capture the reception of a bit sequence from the Learner.
     """
     def register(f):
-        f = method_to_func(f)
+        # The filtering condition is either the target bit itself or nothing
         if target_sequence:
-            csequence = re.compile(target_sequence)
+            condition = PatternCondition(target_sequence, 'sequence')
         else:
-            csequence = None
-        # The filtering condition is either the target bit itself or nothing
-        global_event_handlers[f] = Trigger(
-            SequenceReceived,
-            lambda e: csequence is None or csequence.search(e.sequence), f)
-        return f
+            condition = lambda e: True
+        return set_trigger(f, SequenceReceived, condition)
     return register
 
 
@@ -225,17 +245,12 @@ def on_output_sequence(target_sequence=None):
     Environment.
     """
     def register(f):
-        f = method_to_func(f)
+        # The filtering condition is either the target bit itself or nothing
         if target_sequence:
-            csequence = re.compile(target_sequence)
+            condition = PatternCondition(target_sequence, 'output_sequence')
         else:
-            csequence = None
-        # The filtering condition is either the target bit itself or nothing
-        global_event_handlers[f] = Trigger(
-            OutputSequenceUpdated,
-            lambda e: csequence is None or csequence.search(e.output_sequence),
-            f)
-        return f
+            condition = lambda e: True
+        return set_trigger(f, OutputSequenceUpdated, condition)
     return register
 
 
@@ -244,38 +259,84 @@ def on_timeout():
     Decorator to capture the Timeout event.
     """
     def register(f):
-        f = method_to_func(f)
         # There is no filtering condition (it always activates if registered)
-        global_event_handlers[f] = Trigger(Timeout, lambda e: True, f)
-        return f
+        return set_trigger(f, Timeout, lambda e: True)
     return register
 
 
 def handler_to_trigger(f):
-    '''checks whether f is a function and it was registered to a Trigger.
-    If so, it returns the trigger.
+    '''checks whether f is a function (or a method) that was registered to a
+    Trigger. If so, it returns the trigger.
     '''
-    try:
-        if f in global_event_handlers:
-            return global_event_handlers[f]
-        else:
-            return None
-    except TypeError:
-        # if f is unhashable, it's definetly not a function
-        return None
+    trigger = getattr(method_to_func(f), TRIGGER_ATTRIBUTE, None)
+    return trigger if isinstance(trigger, Trigger) else None
+
+
+# stands for all the keys of a dictionary in the recorded changes and reads
+_ALL_KEYS = object()
+
+# values that cannot change without the State noticing it
+_IMMUTABLE_TYPES = (int, float, complex, bool, type(None), str, bytes,
+                    tuple, frozenset)
+try:
+    _IMMUTABLE_TYPES += (long, unicode)
+except NameError:  # Python 3
+    pass
+
+
+class _SilentChangesTracker(object):
+    '''
+    Records in the State the changes made to the wrappers without going
+    through __setitem__ (they do not raise StateChanged events, as they never
+    have).
+    '''
+    def __delitem__(self, key):
+        super(_SilentChangesTracker, self).__delitem__(key)
+        self._owner._mark_changed((self._name, key), (self._name, _ALL_KEYS))
+
+    def pop(self, *args):
+        try:
+            return super(_SilentChangesTracker, self).pop(*args)
+        finally:
+            self._owner._mark_changed(self._name)
 
+    def popitem(self):
+        try:
+            return super(_SilentChangesTracker, self).popitem()
+        finally:
+            self._owner._mark_changed(self._name)
+
+    def clear(self):
+        super(_SilentChangesTracker, self).clear()
+        self._owner._mark_changed(self._name)
+
+    def update(self, *args, **kwargs):
+        try:
+            super(_SilentChangesTracker, self).update(*args, **kwargs)
+        finally:
+            self._owner._mark_changed(self._name)
+
+    def setdefault(self, *args):
+        try:
+            return super(_SilentChangesTracker, self).setdefault(*args)
+        finally:
+            self._owner._mark_changed(self._name)
 
-class StateTrackingDefaultdictWrapper(defaultdict):
+
+class StateTrackingDefaultdictWrapper(_SilentChangesTracker, defaultdict):
     '''This is a wrapper for variables stored in a State object so
     if something in them change, the original State also gets changed'''
-    def __init__(self, obj, owner):
-        '''owner here is the State or a parent StateVariable'''
+    def __init__(self, obj, owner, name=None):
+        '''owner here is the State or a parent StateVariable, and name the
+        variable that holds the wrapper in it'''
         super(StateTrackingDefaultdictWrapper, self).__init__(
             obj.default_factory, obj)
         self._owner = owner
+        self._name = name
 
     def __setitem__(self, name, value):
         super(StateTrackingDefaultdictWrapper, self).__setitem__(name, value)
+        self._owner._mark_changed((self._name, name), (self._name, _ALL_KEYS))
         self._raise_state_changed()
 
     def _raise_state_changed(self):
@@ -283,16 +344,19 @@ class StateTrackingDefaultdictWrapper(defaultdict):
         return self._owner._raise_state_changed()
 
 
-class StateTrackingDictionaryWrapper(dict):
+class StateTrackingDictionaryWrapper(_SilentChangesTracker, dict):
     '''This is a wrapper for variables stored in a State object so
     if something in them change, the original State also gets changed'''
-    def __init__(self, obj, owner):
-        '''owner here is the State or a parent StateVariable'''
+    def __init__(self, obj, owner, name=None):
+        '''owner here is the State or a parent StateVariable, and name the
+        variable that holds the wrapper in it'''
         super(StateTrackingDictionaryWrapper, self).__init__(obj)
         self._owner = owner
+        self._name = name
 
     def __setitem__(self, name, value):
         super(StateTrackingDictionaryWrapper, self).__setitem__(name, value)
+        self._owner._mark_changed((self._name, name), (self._name, _ALL_KEYS))
         self._raise_state_changed()
 
     def _raise_state_changed(self):
@@ -302,34 +366,227 @@ class StateTrackingDictionaryWrapper(dict):
 
 class State(object):
     '''Holds the state variables for a Task or a world and raises events when
-    they change'''
+    they change.
+
+    It also records when each variable (and each key of the dictionaries)
+    last changed, so the outcome of the `on_state_changed` conditions can be
+    reused until something that they read changes (see `StateCondition`).
+    '''
     def __init__(self, owner):
         '''owner is the Taks or World whose state we keep track of'''
         super(State, self).__setattr__('_owner', owner)
         super(State, self).__setattr__('logger',
                                         logging.getLogger(__name__))
+        # number of changes so far, and the change in which each variable
+        # (or (variable, key) pair) last changed
+        super(State, self).__setattr__('_clock', 0)
+        super(State, self).__setattr__('_changed_at', {})
+        # outcomes of the conditions that read this state (see
+        # `StateCondition`)
+        super(State, self).__setattr__('_condition_cache', {})
 
     def __setattr__(self, name, value):
         '''intercept every time a value is updated to raise the associated event
         '''
         # wrap the variable in an StateVariable to report whether it changes
         if isinstance(value, defaultdict):
-            self.logger.debug("Wrapping variable {0} as a defaultdict"
-                             .format(value))
-            value = StateTrackingDefaultdictWrapper(value, self)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Wrapping variable %s as a defaultdict",
+                                  value)
+            value = StateTrackingDefaultdictWrapper(value, self, name)
         elif isinstance(value, dict):
-            self.logger.debug("Wrapping variable {0} as a dict".format(value))
-            value = StateTrackingDictionaryWrapper(value, self)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Wrapping variable %s as a dict", value)
+            value = StateTrackingDictionaryWrapper(value, self, name)
         # apply the assignment operation
         super(State, self).__setattr__(name, value)
+        self._mark_changed(name)
         # raise a StateChanged
         self._raise_state_changed()
 
+    def _mark_changed(self, *keys):
+        clock = self._clock + 1
+        super(State, self).__setattr__('_clock', clock)
+        for key in keys:
+            self._changed_at[key] = clock
+
+    def _changed_since(self, clock, keys):
+        '''Tells if any of the variables (or keys) changed after the clock'''
+        changed_at = self._changed_at
+        for key in keys:
+            if changed_at.get(key, 0) > clock:
+                return True
+        return False
+
     def _raise_state_changed(self):
         return self._owner._raise_state_changed()
 
 
-class ScriptSet(object):
+# (the attributes of the readers are fetched past their __getattribute__)
+_get_slot = object.__getattribute__
+
+
+class _StateReads(object):
+    '''
+    Stands for a State while a condition is evaluated and records the
+    variables that it reads. If the condition gets hold of a value that can
+    change in place (e.g. a list), its reads are not enough to tell when its
+    outcome changes, and they are marked as volatile.
+    '''
+    __slots__ = ('state', 'clock', 'keys', 'volatile')
+
+    def __init__(self, state):
+        self.state = state
+        self.clock = state._clock
+        self.keys = set()
+        self.volatile = False
+
+    def __getattribute__(self, name):
+        _get_slot(self, 'keys').add(name)
+        value = getattr(_get_slot(self, 'state'), name)
+        if isinstance(value, (StateTrackingDefaultdictWrapper,
+                              StateTrackingDictionaryWrapper)):
+            return _DictReads(value, name, self)
+        _check_read(self, value)
+        return value
+
+
+def _check_read(reads, value):
+    if not isinstance(value, _IMMUTABLE_TYPES):
+        reads.volatile = True
+
+
+def _get_reads(reads):
+    '''
+    Returns the state, its clock before the reads and the keys read, or None
+    if the reads are volatile.
+    '''
+    if _get_slot(reads, 'volatile'):
+        return None
+    return (_get_slot(reads, 'state'), _get_slot(reads, 'clock'),
+            _get_slot(reads, 'keys'))
+
+
+class _DictReads(object):
+    '''
+    Stands for a dictionary of the State while a condition is evaluated. The
+    reads of single keys are recorded as such, and any other use of the
+    dictionary as a read of all its keys.
+    '''
+    def __init__(self, dictionary, name, reads):
+        self.__dict = dictionary
+        self.__name = name
+        self.__reads = reads
+        self.__keys = _get_slot(reads, 'keys')
+
+    def __getitem__(self, key):
+        self.__keys.add((self.__name, key))
+        value = self.__dict[key]
+        _check_read(self.__reads, value)
+        return value
+
+    def get(self, key, default=None):
+        self.__keys.add((self.__name, key))
+        value = self.__dict.get(key, default)
+        _check_read(self.__reads, value)
+        return value
+
+    def __contains__(self, key):
+        self.__keys.add((self.__name, key))
+        return key in self.__dict
+
+    def _read_all(self):
+        self.__keys.add((self.__name, _ALL_KEYS))
+        for value in dict.values(self.__dict):
+            _check_read(self.__reads, value)
+        return self.__dict
+
+    def __getattr__(self, name):
+        return getattr(self._read_all(), name)
+
+    def __len__(self):
+        return len(self._read_all())
+
+    def __iter__(self):
+        return iter(self._read_all())
+
+    def __eq__(self, other):
+        return self._read_all() == other
+
+    def __ne__(self, other):
+        return self._read_all() != other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self._read_all())
+
+
+class StateCondition(object):
+    '''
+    Trigger condition of the `on_state_changed` handlers: it evaluates the
+    given function on the state (or the world and the task states) of the
+    event.
+
+    The outcome is kept in the State of the task together with the variables
+    and keys that the function read, and it is reused (without evaluating
+    the function) as long as none of them changes. The function must thus
+    only depend on the states (and on values that do not change while the
+    task runs).
+    '''
+    def __init__(self, condition):
+        self.condition = condition
+
+    def __call__(self, event):
+        if event.second_state:
+            states = (event.state, event.second_state)
+        else:
+            states = (event.state,)
+        cache = states[-1]._condition_cache
+        entry = cache.get(self)
+        # (the states are compared by identity: they are replaced whenever
+        # the task or the world starts again)
+        if entry is not None and entry[0] == states:
+            for state, clock, keys in entry[1]:
+                if state._clock != clock and \
+                        state._changed_since(clock, keys):
+                    break
+            else:
+                return entry[2]
+        readers = [_StateReads(state) for state in states]
+        outcome = self.condition(*readers)
+        reads = []
+        for reader in readers:
+            read = _get_reads(reader)
+            if read is None:
+                cache.pop(self, None)
+                return outcome
+            reads.append(read)
+        cache[self] = (states, reads, outcome)
+        return outcome
+
+
+class TriggerCollector(type):
+    '''
+    Metaclass of the tasks and worlds: when a class is created, it collects
+    the triggers of its decorated methods (including the inherited ones) in
+    its `_trigger_table`.
+    '''
+    def __init__(cls, name, bases, namespace):
+        super(TriggerCollector, cls).__init__(name, bases, namespace)
+        triggers = []
+        for fname in dir(cls):
+            trigger = handler_to_trigger(getattr(cls, fname, None))
+            if trigger:
+                triggers.append(trigger)
+        cls._trigger_table = tuple(triggers)
+
+
+# (this is how a metaclass is set both in Python 2 and 3)
+_ScriptSetBase = TriggerCollector(str('_ScriptSetBase'), (object,), {})
+
+
+class ScriptSet(_ScriptSetBase):
     """
     Base class for the World and the Task. It contains all of its common
     behavior.
@@ -343,13 +600,11 @@ class ScriptSet(object):
         self.ended_updated = Observable()
         # a bit ugly, but there are worse things in life
         self.state_updated = Observable()
-        # remember dynamically register handlers to destroy their triggers
-        self.dyn_handlers = set()
+        # triggers of the dynamically registered handlers (by handler)
+        self.dyn_handlers = {}
 
     def clean_dynamic_handlers(self):
-        for h in self.dyn_handlers:
-            del global_event_handlers[h]
-        self.dyn_handlers = set()
+        self.dyn_handlers = {}
 
     def has_started(self):
         return self._started
@@ -370,22 +625,13 @@ class ScriptSet(object):
 
     def get_triggers(self):
         '''Returns the set of triggers that have been registered for this
-        task
+        task (through the decorators on its methods)
         '''
-        triggers = []
-        for fname in dir(self):
-            try:
-                # We try to extract the function object that was registered
-                try:
-                    f = getattr(self, fname).im_func
-                except AttributeError: # Python 3
-                    f = getattr(self, fname).__func__
-                trigger = handler_to_trigger(f)
-                if trigger:
-                    triggers.append(trigger)
-            except AttributeError:
-                pass
-        return triggers
+        return list(self._trigger_table)
+
+    def get_dynamic_triggers(self):
+        '''Returns the triggers of the handlers added with `add_handler`'''
+        return list(self.dyn_handlers.values())
 
     def get_name(self):
         '''Some unique identifier of the task'''
@@ -393,19 +639,20 @@ class ScriptSet(object):
 
     def add_handler(self, handler):
         '''
-        Adds and registers a handler dynamically during a task runtime.
+        Adds and registers a handler dynamically during a task runtime. The
+        handler is either a decorated bound method (which the decorators turn
+        into its trigger) or a decorated function.
         '''
-        trigger = handler_to_trigger(handler)
+        if isinstance(handler, Trigger):
+            trigger = handler
+        else:
+            trigger = handler_to_trigger(handler)
         if trigger:
             self._env._register_task_trigger(self, trigger)
-            self.dyn_handlers.add(handler)
+            self.dyn_handlers[trigger.event_handler] = trigger
 
     def _raise_state_changed(self):
-        ret = self._env.raise_state_changed()
-        if self.has_started():
-            # notify (outside) observers
-            self.state_updated(self)
-        return ret
+        return self._env.state_changed(self)
 
     def __str__(self):
         return str(self.__class__.__name__)
@@ -456,7 +703,7 @@ class Task(ScriptSet):
         # if we are still in the process of outputting a message,
         # let it finish
         if t >= self._max_time and self._env._output_channel.is_empty():
-            self._env.event_manager.raise_event(Timeout())
+            self._env.raise_event(Timeout())
             self.end()
             return True
         return False
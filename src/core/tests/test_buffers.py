@@ -0,0 +1,97 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree. An additional grant
+# of patent rights can be found in the PATENTS file in the same directory.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import unittest
+import core.buffers as buffers
+
+
+class TestBuffers(unittest.TestCase):
+
+    def testBitBufferAppend(self):
+        bb = buffers.BitBuffer()
+        bits = '0110100111'
+        for i, b in enumerate(bits):
+            bb.append(b)
+            self.assertEqual(i + 1, len(bb))
+            self.assertEqual(bits[:i + 1], bb.to_string())
+        # ints are also accepted
+        bb.append(1)
+        bb.append(0)
+        self.assertEqual(bits + '10', bb.to_string())
+
+    def testBitBufferRanges(self):
+        bits = '0100100001101001001000000111'
+        bb = buffers.BitBuffer(bits)
+        for start in range(len(bits) + 1):
+            self.assertEqual(bits[start:], bb.to_string(start))
+            for end in range(start, len(bits) + 1):
+                self.assertEqual(bits[start:end], bb.to_string(start, end))
+
+    def testBitBufferRejectsSymbols(self):
+        bb = buffers.BitBuffer('01')
+        self.assertRaises(ValueError, bb.append, 'a')
+        # the buffer is left untouched
+        self.assertEqual('01', bb.to_string())
+        bb.clear()
+        self.assertEqual(0, len(bb))
+        self.assertEqual('', bb.to_string())
+
+    def testBitBufferDiscard(self):
+        bits = '0100100001101001001000000111'
+        for n in range(len(bits) + 2):
+            bb = buffers.BitBuffer(bits)
+            bb.discard(n)
+            self.assertEqual(bits[n:], bb.to_string())
+            self.assertEqual(bits[n + 1:n + 5], bb.to_string(1, 5))
+            bb.extend('10')
+            self.assertEqual(bits[n:] + '10', bb.to_string())
+            self.assertEqual(len(bits[n:]) + 2, len(bb))
+
+    def testBitBufferPackedView(self):
+        bb = buffers.BitBuffer('0110000101')
+        view = bb.packed_view()
+        self.assertEqual(b'a@', view.tobytes())
+        # the bits cannot be written through the view on any version
+        self.assertTrue(view.readonly)
+        with self.assertRaises(TypeError):
+            view[0:1] = b'b'
+        self.assertEqual('0110000101', bb.to_string())
+        # growing and discarding leave the outstanding views untouched
+        bb.extend('0' * 1000)
+        bb.discard(9)
+        self.assertEqual(b'a@', view.tobytes())
+        self.assertEqual(1, bb.get_bit_offset())
+        self.assertEqual(b'@', bb.packed_view().tobytes()[:1])
+
+    def testSymbolBuffer(self):
+        sb = buffers.SymbolBuffer('ab')
+        sb.append('c')
+        self.assertEqual(3, len(sb))
+        self.assertEqual('abc', sb.to_string())
+        self.assertEqual('bc', sb.to_string(1))
+        self.assertEqual('b', sb.to_string(1, 2))
+        sb.discard(2)
+        self.assertEqual('c', sb.to_string())
+
+    def testWords(self):
+        self.assertEqual('01100001', buffers.word_to_bits(97, 8))
+        self.assertEqual('0101', buffers.word_to_bits(5, 4))
+        self.assertEqual(5, buffers.bits_to_word('0101'))
+        self.assertEqual(5, buffers.bits_to_word([0, 1, 0, 1]))
+        self.assertRaises(ValueError, buffers.word_to_bits, 16, 4)
+        self.assertRaises(ValueError, buffers.word_to_bits, -1, 4)
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
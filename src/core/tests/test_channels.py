@@ -10,8 +10,13 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 import unittest
+import random
 import core.serializer as serializer
 import core.channels as channels
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class TestChannels(unittest.TestCase):
@@ -29,6 +34,32 @@ class TestChannels(unittest.TestCase):
         for b in serialized_test_string:
             ic.consume_bit(b)
 
+    def testInputBinaryBuffer(self):
+        slzr = serializer.StandardSerializer()
+        ic = channels.InputChannel(slzr)
+        serialized_test_string = slzr.to_binary('my message')
+        sequences = []
+        ic.sequence_updated.register(sequences.append)
+        for i, b in enumerate(serialized_test_string):
+            ic.consume_bit(b)
+            self.assertEqual(serialized_test_string[:i + 1], ic.get_binary())
+        self.assertEqual(serialized_test_string, sequences[-1])
+        self.assertEqual('', ic.get_undeserialized())
+        ic.consume_bit(0)
+        ic.consume_bit(1)
+        self.assertEqual('01', ic.get_undeserialized())
+
+    def testInputIdentitySerialization(self):
+        slzr = serializer.IdentitySerializer()
+        ic = channels.InputChannel(slzr)
+        test_string = 'my message'
+        for c in test_string:
+            ic.consume_bit(c)
+        self.assertEqual(test_string, ic.get_binary())
+        self.assertEqual(test_string, ic.get_text())
+        ic.clear()
+        self.assertEqual('', ic.get_binary())
+
     def testInputClear(self):
         slzr = serializer.StandardSerializer()
         ic = channels.InputChannel(slzr)
@@ -43,6 +74,76 @@ class TestChannels(unittest.TestCase):
         ic.message_updated.register(all_good)
         ic.clear()
 
+    def testInputDeltas(self):
+        slzr = serializer.StandardSerializer()
+        ic = channels.InputChannel(slzr)
+        bits, texts = [], []
+        ic.sequence_appended.register(lambda b, o: bits.append((b, o)))
+        ic.message_appended.register(lambda t, o: texts.append((t, o)))
+        data = slzr.to_binary(u'a\u03B1b')
+        for b in data:
+            ic.consume_bit(b)
+        self.assertEqual(list(zip(data, range(len(data)))), bits)
+        self.assertEqual([('a', 0), (u'\u03B1', 1), ('b', 2)], texts)
+
+    def testInputHistory(self):
+        slzr = serializer.StandardSerializer()
+        ic = channels.InputChannel(slzr, max_history=16)
+        # garbage that never deserializes is not kept forever
+        for _ in range(1000):
+            ic.consume_bit('1')
+        self.assertTrue(16 <= len(ic.get_binary()) <= 32)
+        self.assertTrue(len(ic.get_undeserialized()) <= 32)
+        text = 'a long message. ' * 3
+        data = slzr.to_binary(text)
+        for b in data:
+            ic.consume_bit(b)
+        self.assertEqual(data[-16:], ic.get_binary()[-16:])
+        self.assertTrue(16 <= len(ic.get_text()) <= 32)
+        self.assertTrue(text.endswith(ic.get_text()))
+        self.assertEqual('', ic.get_undeserialized())
+
+    def testInputView(self):
+        slzr = serializer.StandardSerializer()
+        ic = channels.InputChannel(slzr, max_history=16)
+        view = ic.get_view()
+        bits = slzr.to_binary('hey')
+        for b in bits:
+            ic.consume_bit(b)
+        self.assertEqual(24, len(view))
+        self.assertEqual('hey', view.get_text())
+        packed = view.get_packed()
+        self.assertEqual(b'hey', packed.tobytes())
+        self.assertEqual(0, view.get_bit_offset())
+        # an outstanding view does not prevent the channel from growing
+        for b in slzr.to_binary('!' * 100):
+            ic.consume_bit(b)
+        self.assertEqual(b'hey', packed.tobytes())
+        self.assertEqual(ic.get_binary(), ''.join(
+            format(c, '08b') for c in bytearray(view.get_packed().tobytes())
+        )[view.get_bit_offset():])
+        # the view follows the channel
+        ic.clear()
+        self.assertEqual(0, len(view))
+        self.assertEqual('', view.get_text())
+        ic = channels.InputChannel(serializer.IdentitySerializer())
+        ic.consume_bit('a')
+        self.assertEqual('a', ic.get_view().get_text())
+        self.assertRaises(TypeError, ic.get_view().get_packed)
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def testInputViewArrays(self):
+        slzr = serializer.StandardSerializer()
+        ic = channels.InputChannel(slzr)
+        for b in slzr.to_binary('hi') + '101':
+            ic.consume_bit(b)
+        view = ic.get_view()
+        arr = view.get_packed_array()
+        self.assertEqual([ord('h'), ord('i'), 0xA0], arr.tolist())
+        self.assertFalse(arr.flags.writeable)
+        self.assertEqual(ic.get_binary(),
+                         ''.join(str(b) for b in view.get_bits_array()))
+
     def testOutputSerialization(self):
         slzr = serializer.StandardSerializer()
         oc = channels.OutputChannel(slzr)
@@ -52,6 +153,52 @@ class TestChannels(unittest.TestCase):
         for b in serialized_test_string:
             self.assertEqual(b, oc.consume_bit())
 
+    def testOutputScrambledSerializer(self):
+        class MessageSerializer(object):
+            # only encodes whole messages
+            SILENCE_TOKEN = ' '
+
+            def __init__(self):
+                self._serializer = serializer.StandardSerializer()
+
+            def to_binary(self, message):
+                return self._serializer.to_binary(message)
+
+            def to_text(self, data):
+                return self._serializer.to_text(data)
+
+            def can_deserialize(self, data):
+                return self._serializer.can_deserialize(data)
+
+        slzr = serializer.ScramblingSerializerWrapper(MessageSerializer())
+        self.assertFalse(hasattr(slzr, 'to_binary_symbols'))
+        oc = channels.OutputChannel(slzr)
+        oc.set_message('hello there.')
+        self.assertEqual(slzr.to_binary('hello there.'), oc.get_binary())
+        self.assertEqual('hello there.', slzr.to_text(oc.get_binary()))
+        slzr = serializer.ScramblingSerializerWrapper(
+            serializer.StandardSerializer())
+        self.assertEqual(slzr.to_binary('hello there.'),
+                         ''.join(slzr.to_binary_symbols('hello there.')))
+
+    def testOutputQueue(self):
+        slzr = serializer.StandardSerializer()
+        oc = channels.OutputChannel(slzr)
+        sequences = []
+        oc.sequence_updated.register(sequences.append)
+        oc.add_message('my ')
+        oc.add_message('')
+        oc.add_message('message')
+        serialized_test_string = slzr.to_binary('my message')
+        self.assertEqual(serialized_test_string, oc.get_binary())
+        self.assertEqual(2, len(sequences))
+        for i, b in enumerate(serialized_test_string):
+            self.assertFalse(oc.is_empty())
+            self.assertEqual(b, oc.consume_bit())
+            self.assertEqual(serialized_test_string[i + 1:], sequences[-1])
+        self.assertTrue(oc.is_empty())
+        self.assertEqual(None, oc.consume_bit())
+
     def testConsistency(self):
         slzr = serializer.StandardSerializer()
         ic = channels.InputChannel(slzr)
@@ -105,6 +252,26 @@ class TestChannels(unittest.TestCase):
             ic.consume_bit(b)
         self.assertEqual(something_read[0], len(test_string))
 
+    def testOverwrittingMidSymbol(self):
+        # the character being shipped is completed before the new message
+        for slzr in (serializer.StandardSerializer(),
+                     serializer.GeneralSerializer(' abc')):
+            oc = channels.OutputChannel(slzr)
+            sequences = []
+            oc.sequence_updated.register(sequences.append)
+            oc.set_message('abc')
+            oc.consume_bit()
+            oc.set_message('cb')
+            self.assertEqual(slzr.to_binary('acb')[1:], oc.get_binary())
+            self.assertEqual(oc.get_binary(), sequences[-1])
+            n_sequences = len(sequences)
+            oc.set_message('cb')
+            self.assertEqual(n_sequences, len(sequences))
+            for _ in range(len(slzr.to_binary('a')) - 1):
+                oc.consume_bit()
+            oc.set_message('a')
+            self.assertEqual(slzr.to_binary('a'), oc.get_binary())
+
     def testIsSient(self):
         slzr = serializer.StandardSerializer()
         oc = channels.OutputChannel(slzr)
@@ -121,6 +288,35 @@ class TestChannels(unittest.TestCase):
                 self.assertFalse(oc.is_silent())
         self.assertTrue(oc.is_silent())
 
+    def testIsSilentTracking(self):
+        def scan_is_silent(buf, silent_bits):
+            # is_silent as computed from the whole pending buffer
+            token_size = len(silent_bits)
+            while len(buf) > token_size:
+                buf_suffix, buf = buf[-token_size:], buf[:-token_size]
+                if buf_suffix != silent_bits:
+                    return False
+            return len(buf) == 0 or buf == silent_bits[-len(buf):]
+
+        slzr = serializer.StandardSerializer()
+        silent_bits = slzr.to_binary(slzr.SILENCE_TOKEN)
+        oc = channels.OutputChannel(slzr)
+        rnd = random.Random(1)
+        for _ in range(2000):
+            action = rnd.random()
+            message = rnd.choice(['', ' ', '  ', 'a', 'a ', ' a',
+                                  u'\u03B1 '])
+            if action < 0.05:
+                oc.set_message(message)
+            elif action < 0.1:
+                oc.add_message(message)
+            elif action < 0.11:
+                oc.clear()
+            else:
+                oc.consume_bit()
+            self.assertEqual(scan_is_silent(oc.get_binary(), silent_bits),
+                             oc.is_silent())
+
 
 def main():
     unittest.main()
@@ -12,6 +12,7 @@ from __future__ import unicode_literals
 import unittest
 import core.task as task
 import core.environment as environment
+import core.serializer as serializer
 
 
 class SerializerMock(object):
@@ -22,10 +23,10 @@ class SingleTaskScheduler():
     def __init__(self, task):
         self.task = task
 
-    def get_next_task(self):
+    def get_next_task(self, train_mode=True):
         return self.task
 
-    def step(self, reward):
+    def step(self, reward, train_mode=True):
         pass
 
 
@@ -103,3 +104,193 @@ class TestEnvironment(unittest.TestCase):
         env._deregister_task_triggers(tt)
         self.assertFalse(env.raise_event(task.Ended()))
         self.assertFalse(tt.end_handled)
+
+    def testSymbolGranularity(self):
+        class TestTask(task.Task):
+            def __init__(self, *args, **kwargs):
+                super(TestTask, self).__init__(*args, **kwargs)
+                self.received = []
+                self.timed_out = False
+
+            @task.on_start()
+            def start_handler(self, event):
+                self.set_message(u'hi \u03B1')
+
+            @task.on_message()
+            def message_handler(self, event):
+                self.received.append(event.message)
+
+            @task.on_timeout()
+            def timeout_handler(self, event):
+                self.timed_out = True
+
+        slzr = serializer.StandardSerializer()
+        # 20 characters worth of time
+        tt = TestTask(max_time=20 * len(slzr.to_binary(' ')))
+        env = environment.Environment(slzr, SingleTaskScheduler(tt),
+                                      granularity='symbol')
+        self.assertEqual(8, env.get_time_scale())
+        output = [env.next(None)[0]]
+        for c in 'ok ':
+            output.append(env.next(c)[0])
+        # whole characters are exchanged on every step
+        self.assertEqual(u'hi \u03B1', ''.join(output))
+        self.assertEqual(['o', 'ok', 'ok '], tt.received)
+        for _ in range(16):
+            env.next(' ')
+        self.assertFalse(tt.timed_out)
+        env.next(' ')
+        self.assertTrue(tt.timed_out)
+        self.assertRaises(ValueError, environment.Environment, slzr,
+                          SingleTaskScheduler(tt), granularity='byte')
+
+    def testSequenceEvents(self):
+        class TestTask(task.Task):
+            def __init__(self, *args, **kwargs):
+                super(TestTask, self).__init__(*args, **kwargs)
+                self.sequences = []
+                self.output_sequences = []
+
+            @task.on_start()
+            def start_handler(self, event):
+                self.set_message('a')
+
+            @task.on_sequence('01$')
+            def sequence_handler(self, event):
+                self.sequences.append(event.sequence)
+
+            @task.on_output_sequence('1$')
+            def output_sequence_handler(self, event):
+                self.output_sequences.append(event.output_sequence)
+
+        slzr = serializer.StandardSerializer()
+        tt = TestTask(max_time=100)
+        env = environment.Environment(slzr, SingleTaskScheduler(tt))
+        env.next(None)
+        for b in '0011':
+            env.next(b)
+        self.assertEqual(['001'], tt.sequences)
+        # 'a' is 01100001
+        self.assertEqual(['01', '011'], tt.output_sequences)
+
+    def testEventFeeds(self):
+        class TestTask(task.Task):
+            def __init__(self, *args, **kwargs):
+                super(TestTask, self).__init__(*args, **kwargs)
+                self.messages = []
+
+            @task.on_message('b$')
+            def message_handler(self, event):
+                self.messages.append(event.message)
+
+        slzr = serializer.StandardSerializer()
+        tt = TestTask(max_time=100)
+        env = environment.Environment(slzr, SingleTaskScheduler(tt))
+        env.next(None)
+        input_channel = env._input_channel
+        # only the channel notifications that feed some trigger are observed
+        self.assertEqual(1, len(input_channel.message_appended.observers))
+        self.assertEqual([], input_channel.sequence_appended.observers)
+        self.assertEqual(
+            [], env._output_channel_listener.sequence_appended.observers)
+        self.assertFalse(env.event_manager.has_listeners(
+            task.SequenceReceived))
+        for b in slzr.to_binary('ab'):
+            env.next(b)
+        self.assertEqual(['ab'], tt.messages)
+        env._deregister_task_triggers(tt)
+        self.assertEqual([], input_channel.message_appended.observers)
+
+    def testStateTransactions(self):
+        class TestTask(task.Task):
+            def __init__(self, *args, **kwargs):
+                super(TestTask, self).__init__(*args, **kwargs)
+                self.seen = []
+
+            @task.on_start()
+            def start_handler(self, event):
+                self.state.x = 0
+                self.state.y = 0
+
+            @task.on_message('a$')
+            def message_handler(self, event):
+                self.state.x = 1
+                self.state.y = 1
+                self.state.d = {}
+                self.state.d['k'] = 1
+
+            @task.on_message('b$')
+            def message_reward_handler(self, event):
+                self.state.x = 2
+                self.set_message('ok')
+
+            @task.on_state_changed(lambda s: True)
+            def state_handler(self, event):
+                # the changes are seen all together
+                self.seen.append((self.state.x, self.state.y))
+                if self.state.x == 2:
+                    self.set_message('reacted')
+
+        slzr = serializer.StandardSerializer()
+        tt = TestTask(max_time=1000)
+        env = environment.Environment(slzr, SingleTaskScheduler(tt))
+        updates = []
+        env.next(None)
+        tt.state_updated.register(updates.append)
+        for b in slzr.to_binary('a'):
+            env.next(b)
+        self.assertEqual([(1, 1)], tt.seen)
+        self.assertEqual(1, len(updates))
+        with env.state_transaction():
+            tt.state.x = 3
+            tt.state.y = 3
+            self.assertEqual([(1, 1)], tt.seen)
+        self.assertEqual([(1, 1), (3, 3)], tt.seen)
+        # without a transaction, the changes are raised right away
+        tt.state.y = 4
+        self.assertEqual([(1, 1), (3, 3), (3, 4)], tt.seen)
+        # the changes are committed before a message is set (so the handler
+        # message overrides the reaction)
+        output = [env.next(b)[0] for b in slzr.to_binary('b')]
+        output += [env.next(None)[0] for _ in range(15)]
+        self.assertEqual((2, 4), tt.seen[-1])
+        self.assertEqual('ok', slzr.to_text(''.join(output[-16:])))
+
+    def testWordGranularity(self):
+        class TestTask(task.Task):
+            def __init__(self, *args, **kwargs):
+                super(TestTask, self).__init__(*args, **kwargs)
+                self.received = []
+
+            @task.on_start()
+            def start_handler(self, event):
+                self.set_message('hi')
+
+            @task.on_message()
+            def message_handler(self, event):
+                self.received.append(event.message)
+
+        slzr = serializer.StandardSerializer()
+        tt = TestTask(max_time=100)
+        env = environment.Environment(slzr, SingleTaskScheduler(tt),
+                                      granularity=8)
+        self.assertEqual(8, env.get_word_size())
+        self.assertEqual(8, env.get_time_scale())
+        # one byte is exchanged on every step
+        output = [env.next(None)[0]]
+        for c in 'ok':
+            output.append(env.next(ord(c))[0])
+        self.assertEqual([ord('h'), ord('i'), ord(' ')], output)
+        self.assertEqual(['o', 'ok'], tt.received)
+        self.assertEqual(24, env._task_time)
+        # words that do not fit are rejected
+        self.assertRaises(ValueError, env.next, 256)
+        # words may span several characters
+        env = environment.Environment(slzr, SingleTaskScheduler(
+            TestTask(max_time=100)), granularity=4)
+        output = [env.next(None)[0] for _ in range(4)]
+        self.assertEqual([ord('h') >> 4, ord('h') & 15,
+                          ord('i') >> 4, ord('i') & 15], output)
+        self.assertRaises(ValueError, environment.Environment,
+                          serializer.IdentitySerializer(),
+                          SingleTaskScheduler(tt), granularity=8)
@@ -10,6 +10,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 import unittest
+import random
+import re
 import core.events as events
 
 
@@ -17,6 +19,17 @@ class MyEvent(object):
     pass
 
 
+class OutcomeEvent(object):
+    condition_outcome = None
+
+
+class MessageEvent(object):
+    condition_outcome = None
+
+    def __init__(self, message):
+        self.message = message
+
+
 class TestEvents(unittest.TestCase):
     def __init__(self, *args, **kwargs):
         super(TestEvents, self).__init__(*args, **kwargs)
@@ -33,6 +46,142 @@ class TestEvents(unittest.TestCase):
         em.raise_event(MyEvent())
         self.assertTrue(self.event_raised)
 
+    def testConditionOutcome(self):
+        em = events.EventManager()
+        handled = []
+        em.register(self, events.Trigger(
+            OutcomeEvent, lambda e: 'outcome',
+            lambda self, e: handled.append(e.condition_outcome)))
+        em.register(self, events.Trigger(
+            MyEvent, lambda e: 'outcome', lambda self, e: handled.append(e)))
+        self.assertTrue(em.raise_event(OutcomeEvent()))
+        self.assertEqual(['outcome'], handled)
+        # only the events that declare it get the outcome
+        event = MyEvent()
+        self.assertTrue(em.raise_event(event))
+        self.assertFalse(hasattr(event, 'condition_outcome'))
+        self.assertFalse(em.raise_event(object()))
+
+    def testChangesDuringDispatch(self):
+        em = events.EventManager()
+        calls = []
+
+        def first(self, event):
+            # deregister the rest and register a new trigger (once)
+            if not calls:
+                em.deregister(self, second_trigger)
+                em.register(self, third_trigger)
+            calls.append('first')
+
+        def second(self, event):
+            calls.append('second')
+
+        def third(self, event):
+            calls.append('third')
+        second_trigger = events.Trigger(MyEvent, lambda e: True, second)
+        third_trigger = events.Trigger(MyEvent, lambda e: True, third)
+        em.register(self, events.Trigger(MyEvent, lambda e: True, first))
+        em.register(self, second_trigger)
+        em.raise_event(MyEvent())
+        # the deregistered trigger is skipped and the new one waits for the
+        # next event
+        self.assertEqual(['first'], calls)
+        em.raise_event(MyEvent())
+        self.assertEqual(['first', 'first', 'third'], calls)
+        em.clear()
+        self.assertFalse(em.raise_event(MyEvent()))
+
+    def testListeners(self):
+        em = events.EventManager()
+        changes = []
+        em.listeners_changed.register(lambda t, l: changes.append((t, l)))
+        first = events.Trigger(MyEvent, lambda e: True, lambda s, e: None)
+        second = events.Trigger(MyEvent, lambda e: True, lambda s, e: None)
+        other = events.Trigger(OutcomeEvent, lambda e: True,
+                               lambda s, e: None)
+        self.assertFalse(em.has_listeners(MyEvent))
+        em.register(self, first)
+        em.register(self, second)
+        em.register(self, other)
+        self.assertTrue(em.has_listeners(MyEvent))
+        self.assertEqual(events.event_bit(MyEvent) |
+                         events.event_bit(OutcomeEvent), em.listened)
+        # only the first trigger and the last one change the listeners
+        em.deregister(self, first)
+        self.assertTrue(em.has_listeners(MyEvent))
+        em.deregister(self, second)
+        self.assertFalse(em.has_listeners(MyEvent))
+        em.clear()
+        self.assertEqual(0, em.listened)
+        self.assertEqual([(MyEvent, True), (OutcomeEvent, True),
+                          (MyEvent, False), (OutcomeEvent, False)], changes)
+
+    def testPatternLastChars(self):
+        def last_chars(pattern):
+            chars = events.PatternCondition(pattern, 'message').last_chars
+            return ''.join(sorted(chars)) if chars is not None else None
+        self.assertEqual('\n.', last_chars(r'I give you (an? (\w+))\.$'))
+        self.assertEqual('\nab', last_chars(r'(?:a|[b])+$'))
+        self.assertEqual('.', last_chars(r'\.\Z'))
+        # the last character cannot be told
+        self.assertEqual(None, last_chars(r'a'))
+        self.assertEqual(None, last_chars(r'ba*$'))
+        self.assertEqual(None, last_chars(r'\w$'))
+        self.assertEqual(None, last_chars(r'(?i)a$'))
+        self.assertEqual(None, last_chars(r'(?m)a$'))
+
+    def testPatternMatcher(self):
+        patterns = [r'I turn left\.$', r'I pick up the (\w+)\.$', r'no\.?$',
+                    r'[xy]$', r'x', r'(a|bc)\Z', r'(?i)A$']
+        em = events.EventManager()
+        fired = []
+        for pattern in patterns:
+            def handler(self, event, pattern=pattern):
+                fired.append((pattern, event.condition_outcome.group(0)))
+            em.register(self, events.Trigger(
+                MessageEvent, events.PatternCondition(pattern, 'message'),
+                handler))
+        rnd = random.Random(0)
+        message = ''
+        for _ in range(3000):
+            message += rnd.choice(['I turn left.', 'I pick up the box.',
+                                   'no', '.', 'x', 'y', 'a', 'bc', 'A', ' ',
+                                   '\n'])
+            message = message[-50:]
+            del fired[:]
+            em.raise_event(MessageEvent(message))
+            # the same handlers fire as with a plain search
+            expected = [(p, re.search(p, message).group(0))
+                        for p in patterns if re.search(p, message)]
+            self.assertEqual(expected, fired)
+
+    def testPatternWindow(self):
+        def window(pattern):
+            return events.PatternCondition(pattern, 'message').window
+        self.assertEqual(13, window(r'I turn left\.$'))
+        self.assertEqual(1, window(r'\.\Z'))
+        self.assertEqual(3, window(r'(?<=a)bc$'))
+        # unbounded or not anchored at the end
+        self.assertEqual(None, window(r'(\d+)\.$'))
+        self.assertEqual(None, window(r'turn left\.'))
+        self.assertEqual(None, window(r'(?m)left$'))
+
+    def testPatternWindowMatches(self):
+        patterns = [r'I turn left\.$', r'^ab$', r'(?<=b)c$', r'\bab\Z',
+                    r'(a|bc)$', r'a+$', r'(?<!\n)ab?$']
+        rnd = random.Random(0)
+        message = ''
+        for _ in range(2000):
+            message += rnd.choice(['I turn left.', 'a', 'b', 'c', 'ab', ' ',
+                                   '\n'])
+            for pattern in patterns:
+                match = events.PatternCondition(pattern, 'message')(
+                    MessageEvent(message))
+                expected = re.search(pattern, message)
+                # the same match as a search over the whole message
+                self.assertEqual(expected and expected.span(),
+                                 match and match.span())
+
 
 def main():
     unittest.main()
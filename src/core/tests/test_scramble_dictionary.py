@@ -0,0 +1,84 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree. An additional grant
+# of patent rights can be found in the PATENTS file in the same directory.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import unittest
+import os
+import shutil
+import tempfile
+from core import serializer
+from core.scramble_dictionary import generate_dictionary, load_dictionary
+
+
+class TestScrambleDictionary(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def testMapping(self):
+        words = ['apple', 'Pear', 'plum', 'fig', u'caf\u00e9']
+        d = generate_dictionary(words, seed=3)
+        self.assertEqual(5, len(d))
+        pseudo_words = set()
+        for w in words:
+            pseudo_word = d.get_pseudo_word(w.lower())
+            self.assertEqual(len(w), len(pseudo_word))
+            self.assertEqual(w.lower(), d.get_word(pseudo_word))
+            pseudo_words.add(pseudo_word)
+        self.assertEqual(len(words), len(pseudo_words))
+        self.assertEqual(None, d.get_pseudo_word('banana'))
+        self.assertEqual(None, d.get_pseudo_word('a' * 100))
+        # the dictionary only depends on its arguments
+        d2 = generate_dictionary(reversed(words), seed=3)
+        for w in words:
+            self.assertEqual(d.get_pseudo_word(w.lower()),
+                             d2.get_pseudo_word(w.lower()))
+
+    def testPools(self):
+        d = generate_dictionary(['ab'], seed=1, pool_size=5, max_length=3)
+        mapped = d.get_pseudo_word('ab')
+        drawn = [d.draw_pseudo_word(2) for _ in range(4)]
+        self.assertEqual(len(drawn), len(set(drawn)))
+        self.assertNotIn(mapped, drawn)
+        self.assertTrue(all(len(w) == 2 for w in drawn))
+        # once a pool runs out, longer pseudo-words are drawn
+        self.assertEqual(3, len(d.draw_pseudo_word(2)))
+        # skip the pseudo-words that are in use
+        used = set([d.draw_pseudo_word(3)])
+        d = generate_dictionary(['ab'], seed=1, pool_size=5, max_length=3)
+        self.assertNotIn(d.draw_pseudo_word(3, used), used)
+        d = generate_dictionary(seed=1, pool_size=1, max_length=1)
+        d.draw_pseudo_word(1)
+        self.assertEqual(None, d.draw_pseudo_word(1))
+
+    def testSharedFile(self):
+        path = os.path.join(self.tmp_dir, 'words.dict')
+        generate_dictionary(['hello', 'world'], seed=7).save(path)
+        # two workers map the same words in the same way
+        scramblers = [serializer.ScramblingSerializerWrapper(
+            serializer.StandardSerializer(), dictionary=load_dictionary(path))
+            for _ in range(2)]
+        self.assertEqual(scramblers[0].to_binary('Hello, world.'),
+                         scramblers[1].to_binary('Hello, world.'))
+        self.assertEqual(scramblers[0].to_binary('new words'),
+                         scramblers[1].to_binary('new words'))
+        slzr = scramblers[0]
+        self.assertEqual('Hello, world.',
+                         slzr.to_text(slzr.to_binary('Hello, world.')))
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -10,9 +10,15 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 import unittest
+import random
 import sys
 from core import serializer
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 class TestSerializer(unittest.TestCase):
 
@@ -24,6 +30,175 @@ class TestSerializer(unittest.TestCase):
         # greek letter \alpha (not working in current ascii serialization)
         self.assertEqual(u"\u03B1", slzr.to_text(slzr.to_binary(u"\u03B1")))
 
+    def testIncrementalDecoder(self):
+        slzr = serializer.StandardSerializer()
+        decoder = slzr.incremental_decoder()
+        text = u"a \u03B1\u20AC\U0001F600."
+        decoded = []
+        for b in slzr.to_binary(text):
+            c = decoder.decode_bit(b)
+            if c is not None:
+                decoded.append(c)
+        self.assertEqual(list(text), decoded)
+
+    def testResync(self):
+        # skipping to the byte after the invalid sequence gives the same
+        # result as trying every skip
+        def skip_all(byte_stream):
+            for skip in range(len(byte_stream)):
+                try:
+                    return byte_stream[skip:].decode('utf-8')
+                except UnicodeDecodeError:
+                    pass
+            return None
+
+        slzr = serializer.StandardSerializer()
+        rnd = random.Random(1)
+        pieces = [b'a', b'\xce\xb1', b'\xe2\x82\xac', b'\xf0\x9f\x98\x80',
+                  b'\xce', b'\xb1', b'\xe2\x82', b'\xff', b'\xed\xa0\x80']
+        for _ in range(500):
+            byte_stream = b''.join(rnd.choice(pieces) for _ in range(6))
+            data = ''.join(format(b, '08b') for b in bytearray(byte_stream))
+            self.assertEqual(skip_all(byte_stream), slzr.to_text(data))
+
+    def testIncrementalDecoderGarbage(self):
+        # the incremental decoder must agree with deserializing the
+        # undeserialized chunk every time a new bit arrives
+        slzr = serializer.StandardSerializer()
+        rnd = random.Random(1)
+        for _ in range(20):
+            data = slzr.to_binary(u"ok \u03B1")
+            # random bits and random pieces of UTF-8 sequences
+            data = ''.join(rnd.choice(['0', '1', '11000010', '11100010',
+                                       '11110000', '10000010', '10111111'])
+                           for _ in range(200)) + data
+            decoder = slzr.incremental_decoder()
+            pending = ''
+            for b in data:
+                pending += b
+                expected = slzr.to_text(pending) \
+                    if slzr.can_deserialize(pending) else None
+                self.assertEqual(expected, decoder.decode_bit(b))
+                if expected is not None:
+                    pending = ''
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def testBitsArray(self):
+        text = u"a b \u03B1\u20AC\U0001F600."
+        slzr = serializer.StandardSerializer()
+        arr = slzr.to_bits_array(text)
+        self.assertEqual(np.uint8, arr.dtype)
+        self.assertEqual(slzr.to_binary(text), ''.join(str(b) for b in arr))
+        self.assertEqual(text, slzr.from_bits_array(arr))
+        # garbage in front of the message gets skipped as in to_text
+        data = '1111111101100001'
+        self.assertEqual(slzr.to_text(data), slzr.from_bits_array(
+            np.array([int(b) for b in data])))
+        self.assertEqual(None, slzr.from_bits_array(arr[:4]))
+
+        slzr = serializer.IdentitySerializer()
+        self.assertEqual(text, slzr.from_bits_array(slzr.to_bits_array(text)))
+
+        text = "Hello, scrambled world."
+        slzr = serializer.ScramblingSerializerWrapper(
+            serializer.StandardSerializer())
+        arr = slzr.to_bits_array(text)
+        self.assertEqual(slzr.to_binary(text), ''.join(str(b) for b in arr))
+        self.assertEqual(text, slzr.from_bits_array(arr))
+
+    def testGeneralSerializer(self):
+        slzr = serializer.GeneralSerializer(' 01.,VP')
+        self.assertEqual(3, slzr.L)
+        self.assertEqual('001010000011', slzr.to_binary('01 .'))
+        self.assertEqual('V10.', slzr.to_text(slzr.to_binary('V10.')))
+        # unused codes decode as silence and trailing bits are ignored
+        self.assertEqual('P ', slzr.to_text('11011111'))
+        self.assertRaises(KeyError, slzr.to_binary, 'x')
+        decoder = slzr.incremental_decoder()
+        decoded = [decoder.decode_bit(b) for b in slzr.to_binary('P1,')]
+        self.assertEqual([None, None, 'P', None, None, '1', None, None, ','],
+                         decoded)
+
+        # sparse mappings take as many bits as their largest index needs
+        slzr = serializer.GeneralSerializer({0: ' ', 5: 'a'})
+        self.assertEqual(3, slzr.L)
+        self.assertEqual('101000', slzr.to_binary('a '))
+        self.assertEqual('a  a', slzr.to_text('101000011101'))
+
+        slzr = serializer.ASCIISerializer()
+        self.assertEqual(7, slzr.L)
+        text = 'Hello, world.'
+        self.assertEqual(text, slzr.to_text(slzr.to_binary(text)))
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def testGeneralSerializerBitsArray(self):
+        slzr = serializer.GeneralSerializer(' 01.,VP')
+        text = 'VP10, 01.'
+        arr = slzr.to_bits_array(text)
+        self.assertEqual(np.uint8, arr.dtype)
+        self.assertEqual(slzr.to_binary(text), ''.join(str(b) for b in arr))
+        self.assertEqual(text, slzr.from_bits_array(arr))
+        self.assertEqual(slzr.to_text('11011111'), slzr.from_bits_array(
+            [1, 1, 0, 1, 1, 1, 1, 1]))
+        self.assertRaises(KeyError, slzr.to_bits_array, 'Vx')
+        self.assertRaises(KeyError, slzr.to_bits_array, u'V\u03B1')
+
+    def testHuffmanSerializer(self):
+        slzr = serializer.HuffmanSerializer({' ': 4, 'a': 2, 'b': 1})
+        # the more frequent, the shorter the code (escape comes before 'b')
+        self.assertEqual(['0', '10', '111'], slzr.to_binary_symbols(' ab'))
+        escaped = '110' + format(ord('c'), '021b')
+        self.assertEqual(escaped, slzr.to_binary('c'))
+        text = 'ba c\u00e9 a'
+        self.assertEqual(text, slzr.to_text(slzr.to_binary(text)))
+        # trailing bits that do not make a whole symbol are ignored
+        self.assertEqual('a', slzr.to_text('1011'))
+        self.assertEqual('a', slzr.to_text('10' + escaped[:10]))
+        # out of range code points are dropped
+        self.assertEqual('a', slzr.to_text('110' + '1' * 21 + '10'))
+        decoder = slzr.incremental_decoder()
+        decoded = [decoder.decode_bit(b) for b in slzr.to_binary('a c')]
+        self.assertEqual(['a', ' ', 'c'], [c for c in decoded if c])
+        self.assertEqual([None, 'a'], decoded[:2])
+        # the default code is built from the messages of the tasks
+        slzr = serializer.HuffmanSerializer()
+        text = 'I gave you an apple. Give it back to me!'
+        encoded = slzr.to_binary(text)
+        self.assertEqual(text, slzr.to_text(encoded))
+        self.assertLess(len(encoded),
+                        len(serializer.StandardSerializer().to_binary(text)))
+        random.seed(0)
+        garbage = ''.join(random.choice('01') for _ in range(1000))
+        decoder = slzr.incremental_decoder()
+        self.assertEqual(slzr.to_text(garbage), ''.join(
+            c for c in map(decoder.decode_bit, garbage) if c))
+
+    def testScramblingDecoder(self):
+        # the streaming decoder must agree with deserializing the
+        # undeserialized chunk every time a new bit arrives
+        rnd = random.Random(1)
+        for base in (serializer.StandardSerializer(),
+                     serializer.IdentitySerializer()):
+            slzr = serializer.ScramblingSerializerWrapper(base)
+            words = ['apple', 'Pear', 'PLUM', 'fig', 'x', 'z!']
+            text = ''.join(rnd.choice(words) + rnd.choice(' ,.?  ')
+                           for _ in range(50))
+            # the environment scrambles some of the words
+            slzr.to_binary(' '.join(words[:3]))
+            data = base.to_binary(text)
+            decoder = slzr.incremental_decoder()
+            pending = ''
+            decoded = ''
+            for b in data:
+                pending += b
+                expected = slzr.to_text(pending) \
+                    if slzr.can_deserialize(pending) else None
+                self.assertEqual(expected, decoder.decode_bit(b))
+                if expected is not None:
+                    decoded += expected
+                    pending = ''
+            self.assertEqual(slzr.to_text(data), decoded)
+
     def testScramblingSerializerWrapper(self):
         slzr = serializer.ScramblingSerializerWrapper(
             serializer.StandardSerializer())
@@ -112,6 +112,172 @@ class TestEvents(unittest.TestCase):
         self.assertIn(self.get_func(TestTask.start_handler), handlers)
         self.assertIn(self.get_func(tt.end_handler_func), handlers)
 
+    def testTriggerTableCache(self):
+        class BaseTask(task.Task):
+            @task.on_start()
+            def start_handler(self, event):
+                pass
+
+        class ConcreteTask(BaseTask):
+            @task.on_ended()
+            def ended_handler(self, event):
+                pass
+
+        self.assertEqual(1, len(BaseTask(max_time=10).get_triggers()))
+        tt = ConcreteTask(max_time=10)
+        self.assertEqual(2, len(tt.get_triggers()))
+        # the table is built once per class
+        self.assertIs(ConcreteTask._trigger_table,
+                      ConcreteTask(max_time=10)._trigger_table)
+        self.assertIsNot(BaseTask._trigger_table,
+                         ConcreteTask._trigger_table)
+
+        class EnvironmentMock():
+            def raise_event(self, event):
+                pass
+
+            def _register_task_trigger(self, task, trigger):
+                pass
+
+        def handler(self, event):
+            pass
+        tt.start(EnvironmentMock())
+        tt.add_handler(task.on_ended()(handler))
+        # dynamic handlers are kept apart from the ones of the class
+        self.assertEqual(2, len(tt.get_triggers()))
+        self.assertEqual([handler],
+                         [t.event_handler for t in tt.get_dynamic_triggers()])
+        tt.clean_dynamic_handlers()
+        self.assertEqual([], tt.get_dynamic_triggers())
+
+    def testHandlerRegistry(self):
+        def handler(self, event):
+            pass
+        # the decorators return the handler itself
+        self.assertIs(handler, task.on_start()(handler))
+        self.assertEqual(task.Start, task.handler_to_trigger(handler).type)
+        self.assertEqual(None, task.handler_to_trigger(lambda e: None))
+
+        class EnvironmentMock():
+            def __init__(self):
+                self.triggers = []
+
+            def raise_event(self, event):
+                pass
+
+            def _register_task_trigger(self, task, trigger):
+                self.triggers.append(trigger)
+
+        class TestTask(task.Task):
+            @task.on_start()
+            def start_handler(self, event):
+                pass
+
+        # dynamic handlers belong to the instance that added them
+        tasks = [TestTask(max_time=10), TestTask(max_time=10)]
+        for tt in tasks:
+            tt.start(EnvironmentMock())
+        tasks[0].add_handler(task.on_ended()(handler))
+        self.assertEqual(1, len(tasks[0].get_dynamic_triggers()))
+        self.assertEqual([], tasks[1].get_dynamic_triggers())
+        self.assertEqual(1, len(tasks[1].get_triggers()))
+        tasks[0].clean_dynamic_handlers()
+        self.assertEqual([], tasks[0].get_dynamic_triggers())
+
+    def testBoundMethodHandlers(self):
+        class EnvironmentMock():
+            def raise_event(self, event):
+                pass
+
+            def _register_task_trigger(self, task, trigger):
+                pass
+
+        class TestTask(task.Task):
+            @task.on_start()
+            def start_handler(self, event):
+                pass
+
+            def ended_handler(self, event):
+                pass
+
+        tasks = [TestTask(max_time=10), TestTask(max_time=10)]
+        for tt in tasks:
+            tt.start(EnvironmentMock())
+        tasks[0].add_handler(task.on_ended()(tasks[0].ended_handler))
+        self.assertEqual([self.get_func(TestTask.ended_handler)],
+                         [t.event_handler
+                          for t in tasks[0].get_dynamic_triggers()])
+        # the function shared by the instances is left untouched
+        self.assertEqual(None,
+                         task.handler_to_trigger(TestTask.ended_handler))
+        self.assertEqual([], tasks[1].get_dynamic_triggers())
+        self.assertEqual(1, len(tasks[1].get_triggers()))
+
+        class SubTask(TestTask):
+            pass
+        self.assertEqual(1, len(SubTask(max_time=10).get_triggers()))
+        tasks[0].clean_dynamic_handlers()
+        self.assertEqual(1, len(TestTask(max_time=10).get_triggers()))
+
+    def testStateConditionReads(self):
+        class OwnerMock():
+            def _raise_state_changed(self):
+                pass
+
+        evaluated = []
+
+        def condition(ws, ts):
+            evaluated.append(True)
+            return ws.pos == ts.dest and ws.inventory['apple'] > 0
+
+        ws, ts = task.State(OwnerMock()), task.State(OwnerMock())
+        ws.pos, ws.direction = 0, 'north'
+        ws.inventory = {'apple': 1, 'pear': 0}
+        ts.dest = 0
+        state_condition = task.StateCondition(condition)
+
+        def check(expected, n_evaluations, states=(ws, ts)):
+            del evaluated[:]
+            self.assertEqual(expected, state_condition(
+                task.StateChanged(*states)))
+            self.assertEqual(n_evaluations, len(evaluated))
+        check(True, 1)
+        # the variables and keys that it does not read do not matter
+        ws.direction = 'east'
+        ws.inventory['pear'] = 1
+        check(True, 0)
+        ws.inventory['apple'] = 0
+        check(False, 1)
+        ws.inventory.update(apple=2)
+        check(True, 1)
+        ws.pos = 1
+        check(False, 1)
+        # now it only reads the positions
+        ws.inventory['apple'] = 3
+        check(False, 0)
+        del ws.inventory['apple']
+        ts.dest = 1
+        self.assertRaises(KeyError, check, None, 1)
+        # other states
+        other = task.State(OwnerMock())
+        other.pos = 1
+        other.inventory = {'apple': 1}
+        check(True, 1, (other, ts))
+        check(True, 0, (other, ts))
+        # any other use of a dictionary reads all its keys
+        state_condition = task.StateCondition(
+            lambda ws, ts: evaluated.append(True) or len(ws.inventory))
+        check(1, 1, (other, ts))
+        other.inventory['pear'] = 1
+        check(2, 1, (other, ts))
+        # values that can change in place are read every time
+        ts.dest = [1]
+        state_condition = task.StateCondition(
+            lambda s: evaluated.append(True) or 1 in s.dest)
+        check(True, 1, (ts,))
+        ts.dest.append(2)
+        check(True, 1, (ts,))
+
     def get_func(self, method):
         try:
             return method.im_func
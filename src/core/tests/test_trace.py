@@ -0,0 +1,105 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree. An additional grant
+# of patent rights can be found in the PATENTS file in the same directory.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import unittest
+import core.trace as trace
+import core.task as task
+import core.environment as environment
+import core.serializer as serializer
+
+
+class SingleTaskScheduler():
+    def __init__(self, task):
+        self.task = task
+
+    def get_next_task(self, train_mode=True):
+        return self.task
+
+    def step(self, reward, train_mode=True):
+        pass
+
+
+class TestTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.events = []
+        trace.set_sink(self.events.append)
+
+    def tearDown(self):
+        trace.disable()
+        trace.set_sink(None)
+
+    def testToggle(self):
+        tracer = trace.get_tracer('test')
+        self.assertIs(tracer, trace.get_tracer('test'))
+        self.assertFalse(tracer.enabled)
+        self.assertFalse(trace.active)
+        trace.enable('test')
+        self.assertTrue(tracer.enabled)
+        self.assertTrue(trace.active)
+        tracer.emit('thing', value=[1])
+        self.assertEqual(1, len(self.events))
+        event = self.events[0]
+        self.assertEqual(('test', 'thing', {'value': [1]}),
+                         (event.subsystem, event.name, event.fields))
+        self.assertIn('test.thing value=[1]', str(event))
+        trace.disable('test')
+        self.assertFalse(tracer.enabled)
+        # enabling all the subsystems also covers the later ones
+        trace.enable()
+        self.assertTrue(tracer.enabled)
+        self.assertTrue(trace.get_tracer('test.other').enabled)
+        trace.disable('test')
+        self.assertFalse(tracer.enabled)
+        self.assertTrue(trace.active)
+        trace.disable()
+        self.assertFalse(trace.get_tracer('test.other').enabled)
+        self.assertFalse(trace.active)
+        self.assertRaises(ValueError, trace.enable, 'test', 0)
+
+    def testSampling(self):
+        tracer = trace.get_tracer('test')
+        trace.enable('test', every=3)
+        emitted = []
+        for _ in range(9):
+            trace.step()
+            if tracer.enabled:
+                tracer.emit('step')
+                emitted.append(True)
+        self.assertEqual(3, len(emitted))
+        steps = [e.step for e in self.events]
+        self.assertEqual([3], list(set(b - a for a, b in
+                                       zip(steps, steps[1:]))))
+
+    def testEnvironment(self):
+        class TestTask(task.Task):
+            @task.on_start()
+            def start_handler(self, event):
+                self.set_message('hi')
+
+        tt = TestTask(max_time=100)
+        env = environment.Environment(serializer.StandardSerializer(),
+                                      SingleTaskScheduler(tt))
+        env.next(None)
+        self.assertEqual([], self.events)
+        trace.enable('environment')
+        tt.set_message('bye')
+        self.assertEqual([('environment', 'set_message',
+                           {'message': 'bye', 'priority': 1})],
+                         [(e.subsystem, e.name, e.fields)
+                          for e in self.events])
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
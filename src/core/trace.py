@@ -0,0 +1,140 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree. An additional grant
+# of patent rights can be found in the PATENTS file in the same directory.
+
+'''
+Structured tracing of the hot paths of the environment (the event dispatch,
+the channels, the serializers...), which run on every step.
+
+The trace points are grouped by subsystem, and every subsystem has a
+`Tracer`. A trace point is written as::
+
+    if _tracer.enabled:
+        _tracer.emit('set_message', message=message, priority=priority)
+
+so while its subsystem is disabled (the default) it costs a single attribute
+lookup and nothing is built. The emitted events (`TraceEvent`) keep their
+fields as they are, and they are only rendered as text if the sink asks for
+it (the default sink logs them at DEBUG level, in the `trace.<subsystem>`
+loggers).
+
+The subsystems can be switched on and off at any time (see `enable` and
+`disable`), and they can be sampled: a subsystem enabled with `every=1000`
+only emits the events of one in every 1000 steps of the environment.
+'''
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from collections import namedtuple
+import logging
+
+
+class TraceEvent(namedtuple('TraceEvent',
+                            ('subsystem', 'name', 'step', 'fields'))):
+    '''
+    Something that happened in a subsystem, with its fields (a dict) and the
+    step (counted since tracing was enabled) in which it happened.
+    '''
+    def __str__(self):
+        return '[{0}] {1}.{2} {3}'.format(
+            self.step, self.subsystem, self.name,
+            ' '.join('{0}={1!r}'.format(k, v)
+                     for k, v in sorted(self.fields.items())))
+
+
+class Tracer(object):
+    '''Emits the trace events of a subsystem'''
+    def __init__(self, subsystem):
+        self.subsystem = subsystem
+        # whether the events of the current step are emitted
+        self.enabled = False
+        # emit the events of one in every `every` steps (None if disabled)
+        self.every = None
+
+    def emit(self, name, **fields):
+        '''Sends an event to the sink (check `enabled` before calling)'''
+        _sink(TraceEvent(self.subsystem, name, _step, fields))
+
+    def _set_every(self, every):
+        self.every = every
+        self.enabled = every is not None and _step % every == 0
+
+
+def log_sink(event):
+    '''Default sink: logs the events at DEBUG level'''
+    logger = logging.getLogger('trace.' + event.subsystem)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('%s', event)
+
+
+# tracers by subsystem
+_tracers = {}
+# sampling period of the enabled subsystems (None stands for all of them)
+_settings = {}
+_sink = log_sink
+# steps counted while some subsystem is enabled
+_step = 0
+# whether some subsystem is enabled (the environment only counts the steps
+# while it is)
+active = False
+
+
+def get_tracer(subsystem):
+    '''Returns the tracer of the subsystem (creating it if needed)'''
+    if subsystem not in _tracers:
+        tracer = Tracer(subsystem)
+        tracer._set_every(_settings.get(subsystem, _settings.get(None)))
+        _tracers[subsystem] = tracer
+    return _tracers[subsystem]
+
+
+def enable(subsystem=None, every=1):
+    '''
+    Enables the tracing of a subsystem (or of all of them, if None), emitting
+    the events of one in every `every` steps.
+    '''
+    if every < 1:
+        raise ValueError("The sampling period must be a positive integer")
+    if subsystem is None:
+        _settings.clear()
+    _settings[subsystem] = every
+    _update()
+
+
+def disable(subsystem=None):
+    '''Disables the tracing of a subsystem (or of all of them, if None)'''
+    if subsystem is None:
+        _settings.clear()
+    else:
+        _settings[subsystem] = None
+    _update()
+
+
+def set_sink(sink):
+    '''
+    Sets the function that gets the emitted events (None restores the
+    default `log_sink`).
+    '''
+    global _sink
+    _sink = sink if sink is not None else log_sink
+
+
+def step():
+    '''Marks the start of a new step of the environment'''
+    global _step
+    _step += 1
+    for tracer in _tracers.values():
+        if tracer.every is not None and tracer.every > 1:
+            tracer.enabled = _step % tracer.every == 0
+
+
+def _update():
+    global active
+    for subsystem, tracer in _tracers.items():
+        tracer._set_every(_settings.get(subsystem, _settings.get(None)))
+    active = any(every is not None for every in _settings.values())
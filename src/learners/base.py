@@ -13,6 +13,27 @@ import subprocess
 
 
 class BaseLearner(object):
+    # views over the channels of the environment (see `set_channel_views`)
+    input_view = None
+    output_view = None
+
+    def set_channel_views(self, input_view, output_view):
+        '''
+        Called by the session before the learner starts with read-only views
+        (`core.channels.ChannelView`) over what the learner has received from
+        the environment (input_view) and over what it has sent (output_view).
+        The views show the whole history of the current task: the bits,
+        packed eight per byte in a memoryview or a numpy array, and the text
+        they have been deserialized into. An in-process learner can inspect
+        them on every step instead of keeping its own copy of the stream.
+
+        The views keep following the channels (which are cleared at the start
+        of each task), but the buffers that they return must not be kept
+        across steps.
+        '''
+        self.input_view = input_view
+        self.output_view = output_view
+
     def try_reward(self, reward):
         if reward is not None:
             self.reward(reward)
@@ -28,13 +49,16 @@ class BaseLearner(object):
 
 
 class RemoteLearner(BaseLearner):
-    def __init__(self, cmd, port):
+    def __init__(self, cmd, port, word_size=None):
         try:
             import zmq
         except ImportError:
             raise ImportError("Must have zeromq for remote learner.")
 
         self.port = port if port is not None else 5556
+        # in word granularity the replies are the decimal rendering of the
+        # k-bit words
+        self.word_size = word_size
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.PAIR)
         self.socket.bind("tcp://*:%s" % port)
@@ -48,6 +72,8 @@ class RemoteLearner(BaseLearner):
     def next(self, inp):
         self.socket.send(str(inp))
         reply = self.socket.recv()
+        if self.word_size is not None:
+            return int(reply)
         return reply
 
     def try_reward(self, reward):
@@ -17,6 +17,9 @@ from optparse import OptionParser
 from core.environment import Environment
 from core.config_loader import JSONConfigLoader, PythonConfigLoader
 from core.session import Session
+from core.scramble_dictionary import load_dictionary
+import core.trace as trace
+from core.serializer import IdentitySerializer
 from view.console import ConsoleView
 
 
@@ -29,6 +32,9 @@ def main():
     op.add_option('--scramble', action='store_true', default=False,
                   help='Randomly scramble the words in the tasks for '
                   'a human player.')
+    op.add_option('--scramble-dictionary',
+                  help='Scramble dictionary file with the pseudo-words '
+                  '(see core/scramble_dictionary.py).')
     op.add_option('-w', '--show-world', action='store_true', default=False,
                   help='shows a visualization of the world in the console '
                   '(mainly for debugging)')
@@ -44,6 +50,12 @@ def main():
     op.add_option('-s', '--serializer',
                   default='core.serializer.IdentitySerializer',
                   help='Sets the encoding of characters into bits')
+    op.add_option('-g', '--granularity', default='bit',
+                  help='Exchange one bit, one whole character (symbol) or a '
+                  'word of K bits (an integer K) per step.')
+    op.add_option('--max-history', type=int,
+                  help='Maximum number of bits and characters of the current '
+                  'task that the environment remembers.')
     op.add_option('--learner-cmd',
                   help='The cmd to run to launch RemoteLearner.')
     op.add_option('--learner-port',
@@ -53,9 +65,28 @@ def main():
                   default=10, type=int,
                   help='Maximum reward that we can give to a learner for'
                   ' a given task.')
+    op.add_option('--trace', action='append', default=[],
+                  metavar='SUBSYSTEM[:EVERY]',
+                  help='Logs the trace events of a subsystem (events, '
+                  'environment, channels, serializer or all) in one of every '
+                  'EVERY steps (1 by default). It can be repeated.')
     opt, args = op.parse_args()
     if len(args) == 0:
         op.error("Tasks schedule configuration file required.")
+    if opt.granularity.isdigit() and int(opt.granularity) > 0:
+        opt.granularity = int(opt.granularity)
+    elif opt.granularity not in ('bit', 'symbol'):
+        op.error("Granularity must be 'bit', 'symbol' or a number of bits.")
+    if isinstance(opt.granularity, int) and \
+            opt.learner.startswith('learners.human_learner'):
+        op.error("Human learners do not support word granularity.")
+    for trace_option in opt.trace:
+        subsystem, _, every = trace_option.partition(':')
+        try:
+            trace.enable(None if subsystem == 'all' else subsystem,
+                         int(every) if every else 1)
+        except ValueError:
+            op.error("Invalid trace option '{0}'.".format(trace_option))
     # retrieve the task configuration file
     tasks_config_file = args[0]
     logger = logging.getLogger(__name__)
@@ -63,19 +94,27 @@ def main():
     # we choose how the environment will produce and interpret
     # the bit signal
     serializer = create_serializer(opt.serializer)
+    # in symbol granularity the learner gets the characters themselves
+    channel_serializer = IdentitySerializer() \
+        if opt.granularity == 'symbol' else serializer
+    word_size = opt.granularity if isinstance(opt.granularity, int) \
+        else None
     # create a learner (the human learner takes the serializer)
-    learner = create_learner(opt.learner, serializer, opt.learner_cmd,
-                                opt.learner_port)
+    learner = create_learner(opt.learner, channel_serializer, opt.learner_cmd,
+                                opt.learner_port, word_size)
     # create our tasks and put them into a scheduler to serve them
     task_scheduler = create_tasks_from_config(tasks_config_file)
     # construct an environment
+    scramble_dictionary = load_dictionary(opt.scramble_dictionary) \
+        if opt.scramble_dictionary else None
     env = Environment(serializer, task_scheduler, opt.scramble,
-                      opt.max_reward_per_task)
+                      opt.max_reward_per_task, scramble_dictionary,
+                      opt.granularity, opt.max_history)
     # a learning session
     session = Session(env, learner, opt.time_delay)
     # setup view
-    view = create_view(opt.view, opt.learner, env, session, serializer,
-                        opt.show_world)
+    view = create_view(opt.view, opt.learner, env, session,
+                       channel_serializer, opt.show_world)
     try:
         # send the interface to the human learner
         learner.set_view(view)
@@ -121,13 +160,15 @@ def create_view(view_type, learner_type, env, session, serializer, show_world):
         return View(env, session)
 
 
-def create_learner(learner_type, serializer, learner_cmd, learner_port=None):
+def create_learner(learner_type, serializer, learner_cmd, learner_port=None,
+                   word_size=None):
     c = getc(learner_type)
     if learner_type.startswith('learners.human_learner'):
         return c(serializer)
     else:
         # instantiate the learner
-        return c(learner_cmd, learner_port) if 'RemoteLearner' in str(c) else c()
+        return c(learner_cmd, learner_port, word_size) \
+            if 'RemoteLearner' in str(c) else c()
 
 
 def create_serializer(serializer_type):
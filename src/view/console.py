@@ -7,6 +7,7 @@ import curses.textpad
 import logging
 import locale
 from core.channels import InputChannel
+from core.buffers import word_to_bits
 
 locale.setlocale(locale.LC_ALL, '')
 code = locale.getpreferredencoding()
@@ -108,14 +109,14 @@ class ConsoleView(BaseView):
         # record what the environment says
         self._env_channel = InputChannel(serializer)
         # listen to the updates in these channels
-        self._learner_channel.sequence_updated.register(
-            self.on_learner_sequence_updated)
-        self._learner_channel.message_updated.register(
-            self.on_learner_message_updated)
-        self._env_channel.sequence_updated.register(
-            self.on_env_sequence_updated)
-        self._env_channel.message_updated.register(
-            self.on_env_message_updated)
+        self._learner_channel.sequence_appended.register(
+            self.on_learner_sequence_appended)
+        self._learner_channel.message_appended.register(
+            self.on_learner_message_appended)
+        self._env_channel.sequence_appended.register(
+            self.on_env_sequence_appended)
+        self._env_channel.message_appended.register(
+            self.on_env_message_appended)
         if show_world:
             # register a handler to plot the world if show_world is active
             env.world_updated.register(
@@ -126,15 +127,23 @@ class ConsoleView(BaseView):
         del self.info['current_task']
 
     def on_env_token_updated(self, token):
-        self._env_channel.consume_bit(token)
+        self._consume_token(self._env_channel, token)
 
     def on_learner_token_updated(self, token):
-        self._learner_channel.consume_bit(token)
+        self._consume_token(self._learner_channel, token)
 
-    def on_learner_message_updated(self, message):
-        # we use the fact that messages arrive character by character
-        if self._learner_channel.get_text():
-            self.input_buffer += self._learner_channel.get_text()[-1]
+    def _consume_token(self, channel, token):
+        word_size = self._env.get_word_size()
+        if word_size is None:
+            channel.consume_bit(token)
+        else:
+            # unpack the words exchanged in word granularity
+            for bit in word_to_bits(token, word_size):
+                channel.consume_bit(bit)
+
+    def on_learner_message_appended(self, text, offset):
+        if text:
+            self.input_buffer += text
             self.input_buffer = self.input_buffer[-self._scroll_msg_length:]
             learner_input = self.channel_to_str(
                 self.input_buffer,
@@ -142,17 +151,16 @@ class ConsoleView(BaseView):
             self._win.addstr(self._learner_seq_y, 0, learner_input.encode(code))
             self._win.refresh()
 
-    def on_learner_sequence_updated(self, sequence):
+    def on_learner_sequence_appended(self, bit, offset):
         learner_input = self.channel_to_str(
             self.input_buffer,
             self._learner_channel.get_undeserialized())
         self._win.addstr(self._learner_seq_y, 0, learner_input.encode(code))
         self._win.refresh()
 
-    def on_env_message_updated(self, message):
-        if self._env_channel.get_text():
-            self.output_buffer += \
-                self._env_channel.get_text()[-1]
+    def on_env_message_appended(self, text, offset):
+        if text:
+            self.output_buffer += text
             self.output_buffer = self.output_buffer[-self._scroll_msg_length:]
             env_output = self.channel_to_str(
                 self.output_buffer,
@@ -160,7 +168,7 @@ class ConsoleView(BaseView):
             self._win.addstr(self._teacher_seq_y, 0, env_output.encode(code))
             self._win.refresh()
 
-    def on_env_sequence_updated(self, sequence):
+    def on_env_sequence_appended(self, bit, offset):
         env_output = self.channel_to_str(
             self.output_buffer,
             self._env_channel.get_undeserialized())